@@ -0,0 +1,273 @@
+from __future__ import annotations
+import argparse
+import gc
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, NamedTuple
+
+from adventure import campaign
+from classes import *
+from world_map import WorldMap
+
+BASELINE = Path(__file__).with_name('bench_baseline.json')
+SEED = 2024
+
+
+class Benchmark(NamedTuple):
+    name: str
+    setup: Callable[[], Callable[[], int]]  # Builds a fresh scenario. Returns its run, which returns its operations.
+    repeat: int = 10  # Best of repeat runs is kept.
+
+
+def adventure_bot(world: World) -> Callable[[Prompt], str]:
+    """Scripted answers for the adventure: every player attacks the first standing target, enemy or vase."""
+    def answer(prompt: Prompt) -> str:
+        if prompt.player is None:  # A pause, or a player to select.
+            return world.party.alive[0].name if len(world.party) else ''
+        if prompt.text == 'Action: ':
+            for target in world.ent_list:
+                if target.health > 0:
+                    return f'attack {target.name}'
+            return 'continue'
+        return ''
+    return answer
+
+
+def adventure() -> Callable[[], int]:
+    """The whole adventure.py campaign. One operation per campaign."""
+    def run() -> int:
+        for seed in range(20):
+            world = World(NullSink(), seed=[SEED, seed])
+            play(campaign(world), adventure_bot(world), world)
+        return 20
+    return run
+
+
+def damage() -> Callable[[], int]:
+    """Enemy.damage and Player.damage, dodge rolls included. One operation per hit."""
+    world = World(NullSink(), seed=SEED)
+    knight = Knight(world, 'Ayame')
+    spider = Enemy(world, 'Swamp Spider', Stats(max_health=10 ** 9, attack_power=10, speed=5.5))
+    knight.health = 10 ** 9
+
+    def run() -> int:
+        for _ in range(10_000):
+            spider.damage(1, knight)
+            knight.damage(1, spider)
+        return 20_000
+    return run
+
+
+def equip() -> Callable[[], int]:
+    """Equip and unequip round-trips through the shared inventory. One operation per round-trip."""
+    world = World(NullSink(), seed=SEED)
+    archer = Archer(world, 'Crystia')
+    long_bow = catalog['Long Bow']
+    world.inventory.add(long_bow)
+
+    def run() -> int:
+        for _ in range(5_000):
+            archer.equipment.equip(long_bow)
+            archer.equipment.unequip(EquipSlot.WEAPON)
+        return 5_000
+    return run
+
+
+def loot() -> Callable[[], int]:
+    """Looting fresh entities: item registration, pick ups and stacking. One operation per item."""
+    world = World(NullSink(), seed=SEED)
+    archer = Archer(world, 'Crystia')
+    drops = (Collectibles(10, 'c'), Collectibles(2, 'p'), catalog['Long Bow'], catalog['Pendant of Valor'])
+
+    def run() -> int:
+        for i in range(2_500):
+            archer.loot(Entity(world, f'Vase {i}', 0, drops))
+        return 2_500 * len(drops)
+    return run
+
+
+def aoe() -> Callable[[], int]:
+    """damage_all on 500 enemies at once, as an area of effect ability would. One operation per target hit."""
+    world = World(NullSink(), seed=SEED)
+    archer = Archer(world, 'Crystia')
+    spiders = [Enemy(world, f'Spider {i}', Stats(max_health=10 ** 9, attack_power=10, speed=5.5 + i % 3))
+               for i in range(500)]
+
+    def run() -> int:
+        for _ in range(40):
+            damage_all(world, spiders, 1, archer)
+        return 40 * len(spiders)
+    return run
+
+
+def spawn_spiders(world: World, chunk_x: int, chunk_y: int) -> list:
+    """Chunk loader of the map benchmark: 25 spiders per chunk, on tiles drawn from the world's loot stream."""
+    size, rolls = world.map.chunk_size, world.rng.loot
+    return [(Enemy(world, f'Spider {chunk_x},{chunk_y},{i}'),
+             chunk_x * size + rolls.randint(0, size - 1), chunk_y * size + rolls.randint(0, size - 1))
+            for i in range(25)]
+
+
+def map_queries() -> Callable[[], int]:
+    """A walk through a map of about 100k spiders, querying who is in reach at every step. One operation per step."""
+    world = World(NullSink(), seed=SEED)
+    archer = Archer(world, 'Crystia')
+    world_map = WorldMap(world, spawn_spiders, view=31)
+    world_map.place(archer, 0, 0)  # Loads 63 x 63 chunks around the start.
+    world_map.view = 1
+
+    def run() -> int:
+        for _ in range(10_000):
+            world_map.move(archer, world.rng.targeting.randint(-1, 1), world.rng.targeting.randint(-1, 1))
+            world_map.in_reach(archer)
+        return 10_000
+    return run
+
+
+def scaled(combatants: int, squad: bool = False) -> Callable[[], Callable[[], int]]:
+    """
+    A headless battle between combatants / 2 players and as many spiders, or one squad of them.
+    One operation per turn.
+    """
+    def setup() -> Callable[[], int]:
+        world = World(NullSink(), seed=[SEED, combatants])
+        classes = (Archer, Knight, Cleric)
+        for i in range(combatants // 2):
+            classes[i % 3](world, f'Player {i}').policy = random_target_policy
+        spider = Stats(max_health=20, attack_power=10, speed=5.5)
+        if squad:
+            Squad(world, 'Spiders', spider, count=combatants - combatants // 2)
+        else:
+            for i in range(combatants - combatants // 2):
+                Enemy(world, f'Spider {i}', spider)
+
+        def run() -> int:
+            turns = 0
+
+            def count(event_type, *args) -> None:
+                nonlocal turns
+                turns += event_type is TurnStart
+            world.emit = count  # Counts turns without building events.
+            battle(world, headless=True)
+            return turns
+        return run
+    return setup
+
+
+def random_target_policy(player: Player, prompt: str) -> str:
+    """Attacks a random alive enemy in O(1), or continues if there is none."""
+    enemies = player.world.enemies
+    if prompt == 'Action: ':
+        return f'attack {enemies.choice(player.world.rng.targeting).name}' if len(enemies) else 'continue'
+    return ''
+
+
+def benchmarks() -> list[Benchmark]:
+    return [Benchmark('adventure', adventure),
+            Benchmark('damage', damage),
+            Benchmark('equip', equip),
+            Benchmark('loot', loot),
+            Benchmark('aoe', aoe),
+            Benchmark('map', map_queries, repeat=5),
+            *(Benchmark(f'battle_{n}', scaled(n)) for n in (10, 100, 1_000, 10_000)),
+            Benchmark('squad_10000', scaled(10_000, squad=True))]
+
+
+def calibration() -> int:
+    """Fixed pure-Python work, timed next to every benchmark run to gauge how fast the machine is at that moment."""
+    counts = {}
+    for i in range(50_000):
+        key = i % 97
+        counts[key] = counts.get(key, 0) + i * 3 // 7
+    return 50_000
+
+
+def timed_run(run: Callable[[], int]) -> float:
+    """Seconds per operation of one run."""
+    gc.collect()
+    start = time.perf_counter()
+    operations = run()
+    return (time.perf_counter() - start) / operations
+
+
+def measure(benchmarks: list[Benchmark]) -> dict:
+    """
+    Best time per operation, throughput and bytes allocated per operation of each benchmark, measured with tracemalloc.
+    Repeats are interleaved, one run of each benchmark per pass, so a slow spell of the machine does not spoil every
+    run of the same benchmark. Every run sits between two calibration runs, and its time relative to theirs is what
+    is compared with the baseline: it holds on a machine that speeds up and slows down, where times do not.
+    """
+    best, relative = {}, {}
+    calibrated = timed_run(calibration)
+    for repeat in range(max((benchmark.repeat for benchmark in benchmarks), default=0)):
+        for benchmark in benchmarks:
+            if repeat >= benchmark.repeat:
+                continue
+            elapsed = timed_run(benchmark.setup())
+            before, calibrated = calibrated, timed_run(calibration)
+            best[benchmark.name] = min(best.get(benchmark.name, elapsed), elapsed)
+            relative.setdefault(benchmark.name, []).append(elapsed / ((before + calibrated) / 2))
+
+    results = {}
+    for benchmark in benchmarks:
+        # Allocations are measured on a separate run, as tracing slows everything down.
+        run = benchmark.setup()
+        gc.collect()
+        tracemalloc.start()
+        operations = run()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        time_per_op = best[benchmark.name]
+        results[benchmark.name] = {'us_per_op': time_per_op * 1e6, 'ops_per_s': 1 / time_per_op,
+                                   'relative': statistics.median(relative[benchmark.name]),
+                                   'peak_bytes_per_op': peak / operations}
+    return results
+
+
+def regressions(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Benchmarks slower relative to the calibration, or allocating more, than the baseline by more than tolerance."""
+    found = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        for key in ('relative', 'peak_bytes_per_op'):
+            if result[key] > baseline[name][key] * (1 + tolerance):
+                found.append(f'{name}: {key} {result[key]:.2f} > baseline {baseline[name][key]:.2f}')
+    return found
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description='Benchmarks of the combat and equipment hot paths.',
+        epilog='Run with PYTHONHASHSEED=0, as the baseline was: string hashes shape dicts, and timings with them, '
+               'differently in every process.')
+    parser.add_argument('names', nargs='*', help='benchmarks to run, all by default')
+    parser.add_argument('--save', action='store_true', help=f'store the results as the new baseline in {BASELINE.name}')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown over the baseline')
+    args = parser.parse_args(argv)
+
+    results = measure([benchmark for benchmark in benchmarks() if not args.names or benchmark.name in args.names])
+    for name, result in results.items():
+        print(f'{name:<12} {result["us_per_op"]:>10.2f} us/op {result["ops_per_s"]:>12,.0f} ops/s '
+              f'{result["relative"]:>10.1f} x calibration {result["peak_bytes_per_op"]:>10.1f} peak B/op')
+
+    if args.save:
+        baseline = json.loads(BASELINE.read_text()) if BASELINE.exists() else {}
+        baseline.update(results)
+        BASELINE.write_text(json.dumps(baseline, indent=2) + '\n')
+        return 0
+    if not BASELINE.exists():
+        print('No baseline to compare with. Store one with --save.')
+        return 0
+    found = regressions(results, json.loads(BASELINE.read_text()), args.tolerance)
+    for regression in found:
+        print(f'REGRESSION {regression}')
+    return 1 if found else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
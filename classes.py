@@ -1,58 +1,304 @@
 from __future__ import annotations
-from random import choice, randint, uniform
-from dataclasses import dataclass
+import inspect
+import json
+import math
+import random
+from contextlib import contextmanager
+from dataclasses import dataclass, replace
+from functools import wraps
+from operator import attrgetter
+from pathlib import Path
+from time import perf_counter
+from typing import Callable, Iterable, NamedTuple
+
+from effects import *
+from events import *
+from inventory import Inventory
+from rng import RNG
+from roster import Roster
+from timeline import Timeline
+
+
+class Prompt(NamedTuple):
+    """
+    A request for user input. Game steps are generators that yield prompts and are sent back the answers,
+    so the same game can be played from stdin with play(), or from anything else that can answer them.
+    """
+    text: str
+    player: Player = None  # None for prompts of the world itself.
+
+
+PAUSE = Prompt('')  # Waits for the user between turns and battles. Its answer is ignored.
+
+
+def play(steps, script: Iterable[str] | Callable[[Prompt], str] = None, world: World = None):
+    """
+    Runs game steps to the end and returns what they return. Prompts are answered from stdin, or from script:
+    either lines, e.g. an open file or a list of commands, or a callable answering each prompt, e.g. a bot.
+    Lines skip pauses and lines starting with #, and raise EOFError once they run out, as stdin does.
+    With a world, its sink is flushed before every answer, so buffered text is out before the user is asked.
+    """
+    if script is None:
+        def answer(prompt: Prompt) -> str:
+            return input(prompt.text)
+    elif callable(script):
+        answer = script
+    else:
+        lines = (line.rstrip('\r\n') for line in script if not line.startswith('#'))
+
+        def answer(prompt: Prompt) -> str:
+            if prompt is PAUSE:
+                return ''
+            line = next(lines, None)
+            if line is None:
+                raise EOFError(f'Script ended at prompt {prompt.text!r}')
+            return line
+
+    try:
+        prompt = next(steps)
+        while True:
+            if world is not None:
+                world.sink.flush()
+            prompt = steps.send(answer(prompt))
+    except StopIteration as stop:
+        return stop.value
+
+
+class World:
+    """
+    A game session. Holds everything that belongs to a single game: party, enemies, entities and loose items.
+    Several worlds can live in the same process without affecting each other.
+    """
+
+    def __init__(self, sink=None, seed: int | list[int] = None) -> None:
+        self.sink = ConsoleSink() if sink is None else sink  # Where game events go.
+        self.rng = RNG(seed)  # Dodge, targeting and abilities rolls.
+        self.item_dict = {}  # Items that can be picked up, by name. Lists, as several drops can share a name.
+
+        # Party.
+        self.player_dict = {}  # Translate user inputs.
+        self.player_list = []  # Build battle.
+        self.party = Roster()  # Alive and dead players.
+        self.protector = None  # Player that takes the next enemy attack. Set by its Guard effect.
+        self.now_interacting = False
+        self.in_battle = False
+        self.defeat = False
+
+        self.inventory = Inventory()  # Shared inventory. Potions and coins are stacks in it.
+        self.potions_power = 20
+
+        # Environment and enemies.
+        self.ent_dict = {}  # Translate user inputs.
+        self.ent_list = []
+        self.enemy_list = []  # Build battle.
+        self.enemies = Roster()  # Alive and dead enemies.
+        self.victory = False
+        self.timeline = None  # Turn order of the ongoing battle.
+        self.effects = StatusEffects(self)  # Paralysis, guard, buffs and damage over time.
+        self.metrics = None  # Timings and counters, when turned on with metrics.enable.
+        self.map = None  # Where everyone stands, when the world has a WorldMap.
+
+    @property
+    def num_of_players(self) -> int:
+        """Alive player counter."""
+        return len(self.party)
+
+    @property
+    def potions(self) -> int:
+        return self.inventory[Collectibles.kinds['p']]
+
+    @potions.setter
+    def potions(self, amount: int) -> None:
+        self.inventory[Collectibles.kinds['p']] = amount
+
+    @property
+    def coins(self) -> int:
+        return self.inventory[Collectibles.kinds['c']]
+
+    @coins.setter
+    def coins(self, amount: int) -> None:
+        self.inventory[Collectibles.kinds['c']] = amount
+
+    @property
+    def num_of_enemies(self) -> int:
+        """Number of alive enemies."""
+        return len(self.enemies)
+
+    def enemy_target(self) -> Player:
+        """Player attacked by the next enemy: the protector if there is one alive, else a random alive player."""
+        if self.protector is not None and self.protector.health > 0:
+            return self.protector
+        return self.party.choice(self.rng.targeting)
+
+    def dodge_roll(self, target, source) -> bool:
+        """dodged() for source attacking target, on the dodge stream. Timed and counted when metrics are on."""
+        metrics = self.metrics
+        if metrics is None:
+            return dodged(target.stats.speed, source.stats.speed, self.rng.dodge)
+        start = perf_counter()
+        dodge = dodged(target.stats.speed, source.stats.speed, self.rng.dodge)
+        metrics.observe('dodged', perf_counter() - start)
+        metrics.count('dodges' if dodge else 'hits')
+        return dodge
+
+    @property
+    def sink(self):
+        return self._sink
+
+    @sink.setter
+    def sink(self, sink) -> None:
+        self._sink = sink
+        # Events are only built when the sink listens to them.
+        self.emit = self._emit if sink.listening else self._ignore
+
+    def _emit(self, event_type, *args) -> None:
+        """Builds an event from its type and fields and sends it to the world's sink."""
+        self._sink.write(event_type(*args))
+
+    @staticmethod
+    def _ignore(event_type, *args) -> None:
+        """emit() while the sink does not listen."""
+
+    def say(self, message: str = '') -> None:
+        """Sends a plain game message to the world's sink."""
+        self.emit(Message, message)
+
+    def list_items(self, holder) -> None:
+        """Lists the items of a dead enemy or a broken entity in item_dict, where they can be picked up."""
+        for item in holder.inventory:
+            self.item_dict.setdefault(item.name, []).append(item)
+
+    def unlist_item(self, item) -> None:
+        """Removes one listing of item from item_dict, e.g. once it is picked up."""
+        items = self.item_dict.get(item.name)
+        if items is not None and item in items:
+            items.remove(item)
+            if not items:
+                del self.item_dict[item.name]
+
+    @contextmanager
+    def encounter(self):
+        """
+        Scope of an encounter. Enemies and entities created inside it, and the items they still hold, are released
+        when it ends, however it ends. Players, the inventory and what existed before stay.
+        """
+        mark = len(self.ent_list)
+        try:
+            yield self
+        finally:
+            self.release(mark)
+
+    def release(self, mark: int = 0) -> None:
+        """Forgets every enemy and entity but the first mark ones, with their unclaimed items and map positions."""
+        released = self.ent_list[mark:]
+        if not released:
+            return
+        del self.ent_list[mark:]
+        for member in released:
+            if self.ent_dict.get(member.name) is member:
+                del self.ent_dict[member.name]
+            for item in member.inventory:
+                self.unlist_item(item)
+            if isinstance(member, Enemy):
+                self.enemies.discard(member)
+            if self.map is not None:
+                self.map.remove(member)
+        released = set(released)
+        self.enemy_list = [enemy for enemy in self.enemy_list if enemy not in released]
+
+    def win(self, killer) -> None:
+        """Ends a battle in victory. Every enemy is looted by its killer, or by the first player if it is not one."""
+        self.emit(Victory)
+        looter = killer if isinstance(killer, Player) else self.player_list[0]
+        for enemy in self.enemy_list:
+            looter.loot(enemy)
+
+        # Removes all enemies from dicts.
+        self.enemy_list = []
+        self.enemies.clear()
+        self.victory = True
+
+    def revive_all(self) -> None:
+        """Revives all dead players with a third of their max_health."""
+        for player in list(self.party.dead):
+            player.health = player.stats.max_health / 3
+            self.party.revive(player)
+            self.emit(Revive, player)
 
-item_dict = {}
+    def interaction(self) -> None:
+        """Players are now outside of battle. Any player is able to act until continue is called."""
+        play(self.interaction_steps(), world=self)
+
+    def interaction_steps(self):
+        """Game steps of interaction()."""
+        self.in_battle = False
+        self.now_interacting = True
+        while self.now_interacting:
+            player = yield Prompt('\nSelect a player: ')
+            try:
+                player = self.player_dict[player]
+            except KeyError:
+                self.say('Unknown player')
+                continue
+            self.say(f'\n{player.name}\'s actions:')
+            # We set can_act to 1. While there are no turns outside of battle, players could be immobilized.
+            player.can_act = 1
+            yield from player.user_actions()
 
 
 class Collectibles:
-    """Game collectibles."""
+    """Game collectibles. Inventories stack them by kind."""
+    __slots__ = ('name', 'kind', 'amount')
+    kinds = {'p': 'Potions', 'c': 'Coins'}
 
     def __init__(self, amount: int, col_type: str) -> None:
-        if col_type == 'p':
-            self.name = f"{amount} Potions"
-        if col_type == 'c':
-            self.name = f"{amount} Coins"
+        self.kind = Collectibles.kinds[col_type]
+        self.name = f"{amount} {self.kind}"
         self.amount = amount
 
-        # Stores all instances into a dictionary by name.
-        item_dict.update({str(self.name): self})
+    def times(self, count: int) -> Collectibles:
+        """A stack of count times this one."""
+        col_type = next(key for key, kind in Collectibles.kinds.items() if kind == self.kind)
+        return Collectibles(self.amount * count, col_type)
 
     def __str__(self) -> str:
         return self.name
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Stats:
-    """PC and NPC statistics."""
+    """PC and NPC statistics. Immutable: changes make a new Stats."""
     max_health: float = None
     attack_power: float = None
     speed: float = None
     healing_power: float = None
 
-    def show_stats(self) -> None:
+    def items(self) -> list[tuple[str, float]]:
+        """Name and value of each of the assigned statistics."""
+        return [(key, getattr(self, key)) for key in Stats.__slots__ if getattr(self, key) is not None]
+
+    def rounded(self) -> Stats:
+        """Same stats, rounded to one decimal."""
+        return replace(self, **{key: round(value, 1) for key, value in self.items()})
+
+    def show_stats(self, world: World) -> None:
         """Prints each of the assigned statistics with a format."""
-        for key in self.__dict__:
-            if self.__dict__[key] is not None:
-                stat = key.replace('_', ' ').title()
-                print(f"{stat}: {self.__dict__[key]}")
+        for key, value in self.items():
+            stat = key.replace('_', ' ').title()
+            world.say(f"{stat}: {value}")
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Upgrades(Stats):
     """Stats-multipliers for EquipItems."""
 
-    def upgrade_stats(self, player: Player) -> None:
-        """For each of the stats in Upgrades, increases Player's respective stats."""
-        for key in self.__dict__:
-            if self.__dict__[key] is not None:
-                player.stats.__dict__[key] = round(player.stats.__dict__[key] * self.__dict__[key], 1)
-
-    def downgrade_stats(self, player: Player) -> None:
-        """For each of the stats in Upgrades, decreases Player's respective stats."""
-        for key in self.__dict__:
-            if self.__dict__[key] is not None:
-                player.stats.__dict__[key] = round(player.stats.__dict__[key] / self.__dict__[key], 1)
+    def upgrade_stats(self, stats: Stats) -> Stats:
+        """Returns stats with each of the multipliers in Upgrades applied. Stats that are not set stay unset."""
+        changes = {}
+        for key, multiplier in self.items():
+            if getattr(stats, key) is not None:
+                changes[key] = getattr(stats, key) * multiplier
+        return replace(stats, **changes)
 
 
 # TODO: Not working when creating items.
@@ -65,37 +311,133 @@ class EquipSlot:
 
 # TODO: Consider separating equip items into the available equipment slots.
 class EquipItem:
-    """Equippable items."""
-
-    equip_dict = {}
+    """Equippable items. Items of the catalog have an item_id. Items made on the fly, e.g. tuned copies, do not."""
+    __slots__ = ('name', 'equip_slot', 'for_class', 'upgrades', 'item_id')
 
     def __init__(self, name: str, equip_slot: str, for_class: Player.__class__, upgrades: Upgrades) -> None:
         self.name = name
         self.equip_slot = equip_slot
         self.for_class = for_class
         self.upgrades = upgrades
-
-        # Stores all instances into a dictionary by name.
-        EquipItem.equip_dict.update({str(self.name): self})
-        item_dict.update({str(self.name): self})
+        self.item_id = None
 
     def __str__(self) -> str:
         return self.name
 
 
+class ItemCatalog:
+    """
+    Item definitions, found in O(1) by integer ID or by name. The data file is only read on the first lookup.
+    IDs follow the order of the file; items registered from code come after.
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = path
+        self._by_id = None  # item_id -> item.
+        self._by_name = None  # name -> item.
+
+    def _load(self) -> None:
+        with open(self.path) as file:
+            definitions = json.load(file)
+        classes = {cls.__name__: cls for cls in subclasses(Player)}
+        self._by_id, self._by_name = [], {}
+        for definition in definitions:
+            self.register(EquipItem(definition['name'], definition['slot'], classes[definition['class']],
+                                    Upgrades(**definition.get('upgrades', {}))))
+
+    def register(self, item: EquipItem) -> EquipItem:
+        """Adds an item definition made in code and gives it the next ID. Names must be unique."""
+        if self._by_name is None:
+            self._load()
+        if item.name in self._by_name:
+            raise ValueError(f'{item.name} is already in the catalog')
+        item.item_id = len(self._by_id)
+        self._by_id.append(item)
+        self._by_name[item.name] = item
+        return item
+
+    def __getitem__(self, key: int | str) -> EquipItem:
+        """Item by ID or by name. Raises KeyError if there is none."""
+        if self._by_name is None:
+            self._load()
+        if isinstance(key, str):
+            return self._by_name[key]
+        if not 0 <= key < len(self._by_id):
+            raise KeyError(key)
+        return self._by_id[key]
+
+    def get(self, key: int | str, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key: int | str) -> bool:
+        return self.get(key) is not None
+
+    def __len__(self) -> int:
+        if self._by_name is None:
+            self._load()
+        return len(self._by_id)
+
+
+def subclasses(base: type) -> list[type]:
+    """base and all of its subclasses, e.g. every Player class. Used to resolve class names from data files."""
+    classes = [base]
+    for cls in classes:
+        classes.extend(cls.__subclasses__())
+    return classes
+
+
+catalog = ItemCatalog(Path(__file__).with_name('items.json'))  # Every item of the game.
+
+
+def timed(phase: str, world: Callable = attrgetter('world')):
+    """
+    Times a function as phase when its world has metrics turned on. world finds that world from the first argument.
+    Calls made inside a timed call are part of it and are not timed again.
+    """
+    def decorate(function: Callable) -> Callable:
+        @wraps(function)
+        def timed_function(*args):  # Plain *args: repacking (first, *args) costs more than the check itself.
+            metrics = world(args[0]).metrics
+            if metrics is None or metrics.timing:
+                return function(*args)
+            return metrics.time(phase, function, *args)
+        return timed_function
+    return decorate
+
+
 @dataclass
 class Equipment:
     """Player and Enemies equipment."""
+    __slots__ = ('player', 'weapon', 'armor', 'amulet')
+    equip_slots = ('weapon', 'armor', 'amulet')  # In the order they are shown and applied.
 
     def __init__(self, player: Player, *items):
         self.player = player
         self.weapon = None
         self.armor = None
         self.amulet = None
-        for item in items:  # For each of the passed items, assigns the equipment slot to the item and upgrades stats.
+        for item in items:  # For each of the passed items, assigns the equipment slot to the item.
             setattr(self, item.equip_slot, item)
-            item.upgrades.upgrade_stats(self.player)
+        self.player.stats = self.effective_stats()  # Upgrades stats.
 
+    def effective_stats(self) -> Stats:
+        """
+        Player's base stats with the upgrades of every equipped item, then of every active buff, applied.
+        Computed from the base stats each time, and rounded only once, so equipping never drifts the values.
+        """
+        stats = self.player.base_stats
+        for slot in Equipment.equip_slots:
+            item = getattr(self, slot)
+            if item is not None:
+                stats = item.upgrades.upgrade_stats(stats)
+        for buff in self.player.world.effects.buffs(self.player):
+            stats = buff.upgrades.upgrade_stats(stats)
+        return stats.rounded()
+
+    @timed('equip', lambda equipment: equipment.player.world)
     def equip(self, item: EquipItem) -> None:
         """Equips items."""
         # If another item is equipped, it unequips it.
@@ -103,357 +445,421 @@ class Equipment:
             self.unequip(item.equip_slot)
 
         setattr(self, item.equip_slot, item)  # Assigns the item to its respective slot.
-        Player.inventory.remove(item.name)  # Removes the item from the shared inventory.
-        item.upgrades.upgrade_stats(self.player)  # Upgrades Player stats.
+        self.player.world.inventory.remove(item)  # Removes the item from the shared inventory.
+        self.slots_changed()  # Upgrades Player stats.
+        self.player.world.emit(Equip, self.player, item)
 
+    @timed('unequip', lambda equipment: equipment.player.world)
     def unequip(self, equip_slot: str) -> None:
         """Unequips items from a given slot."""
         item = getattr(self, equip_slot)
         if item is None:
-            print('Nothing equipped!')
+            self.player.world.say('Nothing equipped!')
             return
 
-        Player.inventory.append(item.name)  # Returns the item to the shared inventory.
-        item.upgrades.downgrade_stats(self.player)  # Removes the upgrades given by the item.
+        self.player.world.inventory.add(item)  # Returns the item to the shared inventory.
         setattr(self, equip_slot, None)  # Sets the slot where item was to None.
-        print(f'Unequipped {item}')
+        self.slots_changed()  # Removes the upgrades given by the item.
+        self.player.world.emit(Unequip, self.player, item)
+
+    def slots_changed(self) -> None:
+        """Recomputes the Player's stats. In battle, also moves the Player to its new place in the turn order."""
+        self.player.stats = self.effective_stats()
+        if self.player.world.timeline is not None:
+            self.player.world.timeline.reschedule(self.player)
 
     def show_equipment(self) -> None:
         """Prints each of the equipped items with a format."""
-        for key in self.__dict__:
-            # Skips 'player' attribute.
-            if key != 'player':
-                item = key.title()
-                print(f"{item}: {self.__dict__[key]}")
-
-
-@dataclass
+        for key in Equipment.equip_slots:
+            item = key.title()
+            self.player.world.say(f"{item}: {getattr(self, key)}")
+
+
+class Command(NamedTuple):
+    """A user action of a Player class, as found by its command registry."""
+    function: Callable
+    takes_argument: bool  # Whether the verb is followed by a target, e.g. 'attack Swamp Spider'.
+    steps: bool  # Whether the function is game steps, because it asks for more input.
+
+
+def command(verb: str):
+    """Registers a Player method as the user action for verb. Verbs can have several words, e.g. 'pick up'."""
+    def register(function: Callable) -> Callable:
+        function.verb = verb
+        return function
+    return register
+
+
+def command_registry(cls) -> dict:
+    """
+    Trie of the commands of a Player class, inherited ones included, keyed by verb word.
+    Leaves are Commands; subclasses override the commands of their bases.
+    """
+    verbs = {}
+    for klass in reversed(cls.__mro__):
+        for name, function in vars(klass).items():
+            if hasattr(function, 'verb'):
+                verbs[function.verb] = name
+
+    registry = {}
+    for verb, name in verbs.items():
+        function = getattr(cls, name)  # Overrides of a command method stay commands.
+        *path, last = verb.split()
+        node = registry
+        for word in path:
+            node = node.setdefault(word, {})
+        node[last] = Command(function, len(inspect.signature(function).parameters) > 1,
+                             inspect.isgeneratorfunction(function))
+    return registry
+
+
+@dataclass(eq=False)
 class Player:
     """Player's baseclass."""
-    player_dict = {}  # Translate user inputs.
-    player_list = []  # Build battle.
-    num_of_players = 0  # Alive player counter.
-    now_interacting = False
-    in_battle = False
-    defeat = False
-
-    inventory = []  # Shared inventory.
-    potions = 0
-    coins = 0
-    potions_power = 20
-
-    def __init__(self, name: str) -> None:
+    __slots__ = ('world', 'name', 'stats', 'equipment', 'health', 'kills', 'can_act', 'policy')
+    base_stats = Stats()  # Stats without equipment. Each class sets its own.
+    reach = 1.5  # Tiles from which attacks land on a map. Melee by default, diagonals included.
+    commands = {}  # Command registry of the class. Built once, when the class is created.
+
+    def __init_subclass__(cls, **kwargs) -> None:
+        super().__init_subclass__(**kwargs)
+        cls.commands = command_registry(cls)
+
+    def __init__(self, world: World, name: str) -> None:
+        self.world: World = world
         self.name: str = name
-        self.stats: Stats = Stats()
+        self.stats: Stats = self.base_stats  # Effective stats. Recomputed by Equipment whenever a slot changes.
         self.equipment: Equipment = Equipment(self)  # All slots are None by default.
         self.health: float = self.stats.max_health
         self.kills: int = 0
-        self.can_act: int = 0  # As long as == 1, player will perform actions. next_player sets it to 0 outside battle.
-
-        Player.player_dict.update({str(self.name): self})
-        Player.player_list.append(self)
-        Player.num_of_players += 1
-
-    def action_identifier(self, action: str) -> None:
-        """Identifies each of the user-inputted actions."""
-        match action.split(maxsplit=1):
-            case ['attack', target]:
-                self.user_attack(target)
-            case ['heal', target]:
-                self.user_potions(target)
-            case ['inventory']:
-                Player.user_show_inventory()
-            case ['equipment', target]:
-                Player.user_show_equipment(target)
-            case ['stats', target]:
-                Player.user_show_stats(target)
-            case ['pick up', item]:
-                Player.user_pickup_item(item)
-            case ['loot', target]:
-                self.user_loot(target)
-            case ['equip']:
-                self.user_equip()
-            case ['unequip']:
-                self.user_unequip()
-            case ['change']:
-                self.user_change_player()
-            case ['continue']:
-                self.user_continue()
-            case _:
-                print('Unknown action')
-
-    def user_actions(self) -> None:
-        """Takes in user's inputs to decide the Player's action."""
+        self.can_act: int = 0  # As long as >= 1, player will perform actions. Set to 1 at the start of each turn.
+        self.policy = None  # Callable (player, prompt) -> str or None. When set, replaces user inputs.
+
+        self.world.player_dict.update({str(self.name): self})
+        self.world.player_list.append(self)
+        self.world.party.add(self)
+
+    @classmethod
+    def parse_command(cls, action: str) -> tuple[Command | None, str | None]:
+        """Command of a user-inputted action, and its argument or None. Walks the registry one word at a time."""
+        words = action.split(maxsplit=1)
+        if not words:
+            return None, None
+        node = cls.commands.get(words[0])
+        argument = words[1] if len(words) == 2 else None
+        while type(node) is dict:  # Verb of several words.
+            if argument is None:
+                return None, None
+            words = argument.split(maxsplit=1)
+            node = node.get(words[0])
+            argument = words[1] if len(words) == 2 else None
+        return node, argument
+
+    def action_identifier(self, action: str):
+        """Identifies each of the user-inputted actions. Game steps, as some actions ask for more input."""
+        command, argument = self.parse_command(action)
+        if command is None or command.takes_argument is (argument is None):
+            self.world.say('Unknown action')
+        elif command.steps:
+            yield from (command.function(self) if argument is None else command.function(self, argument))
+        elif argument is None:
+            command.function(self)
+        else:
+            command.function(self, argument)
+
+    def ask(self, prompt: str):
+        """
+        Asks for a user input, as game steps. If self has a policy, the policy answers without yielding,
+        unless it answers None to leave the prompt to the user.
+        """
+        metrics = self.world.metrics
+        if metrics is not None:
+            start = perf_counter()
+        answer = None if self.policy is None else self.policy(self, prompt)
+        if answer is None:
+            answer = yield Prompt(prompt, self)
+        if metrics is not None:
+            metrics.waited(perf_counter() - start)
+        return answer
+
+    def user_actions(self):
+        """Takes in user's inputs to decide the Player's action. Game steps."""
         if self.health <= 0:
             return
 
-        if Player.in_battle:
-            self.can_act += 1
-        # If the Player is in battle can_act should be <= 1.
-        # If this is not the case, the Player has been immobilized (from the environment or an Enemy).
-        if self.can_act <= 0 and Player.in_battle:
-            print(f'{self.name} is immobilized!')
-            return
+        if self.world.in_battle:
+            # A paralyzed Player loses its turn. Paralysis ends on its own, see QueenSpider.paralyze.
+            if self.world.effects.has(self, Paralysis):
+                self.world.emit(Immobilized, self)
+                return
+            self.can_act = 1
 
         # Passive actions do not diminish can_act, allowing the player to perform another action.
         while self.can_act >= 1:
-            action = input('Action: ')
-            self.action_identifier(action)
+            action = yield from self.ask('Action: ')
+            yield from self.action_identifier(action)
 
+    @timed('damage')
     def damage(self, dmg: float, source: Enemy | Player) -> None:
         """Runs whenever the Player takes damage."""
         # Player has a probability to dodge the attack.
-        if dodged(self.stats.speed, source.stats.speed):
-            print(f'{self.name} has dodged the attack!')
+        if self.world.dodge_roll(self, source):
+            self.world.emit(Dodge, self, source)
             return
+        self.take_damage(dmg, source)
 
+    def take_damage(self, dmg: float, source) -> None:
+        """Loses health, without a chance to dodge. Used by damage and by damage over time."""
         self.health = round(self.health - dmg, 1)
-        print(f'{self.name} has taken {dmg} points of damage from {source.name}. Remaining health: {self.health}')
+        self.world.emit(Damage, self, source, dmg, self.health)
 
         if self.health <= 0:
-            Player.num_of_players -= 1  # Decreases the number of players alive.
-            print(f'{self.name} has been incapacitated! '
-                  f'{Player.num_of_players} party members remaining')
-            if Player.num_of_players == 0:
-                Player.defeat = True
-                print(f'All party members incapacitated!')
+            self.world.party.kill(self)  # Decreases the number of players alive.
+            self.world.emit(Kill, self, self.world.num_of_players, 'party')
+            if self.world.num_of_players == 0:
+                self.world.defeat = True
+
+    def restat(self) -> None:
+        """Recomputes stats, e.g. when a buff starts or ends."""
+        self.equipment.slots_changed()
 
     def attack(self, target: Entity | Enemy | Player, dmg: float) -> None:
         """Player's attack."""
         target.damage(dmg, self)
 
+    @command('attack')
     def user_attack(self, target: str) -> None:
         """Attacks a target by self's attack power. Active.'"""
         # First, tries to attack an entity.
         try:
-            target = Entity.ent_dict[target]
+            target = self.world.ent_dict[target]
             attacked_player = False
         except KeyError:
             # If this is not possible, it attacks a player.
             # Assigning attacked_player = True so we can print a special message.
             try:
-                target = Player.player_dict[target]
+                target = self.world.player_dict[target]
                 attacked_player = True
             except KeyError:
-                print('Unknown target')
+                self.world.say('Unknown target')
                 return
 
         if target.health <= 0:
-            print(f"{target.name} is already dead!")
+            self.world.say(f"{target.name} is already dead!")
             return
 
         self.attack(target, self.stats.attack_power)
         if attacked_player:  # Special message.
-            print(f'{target.name} says: What the hell, {self.name}!')
-        if Player.in_battle:
+            self.world.say(f'{target.name} says: What the hell, {self.name}!')
+        if self.world.in_battle:
             self.can_act -= 1
 
     @staticmethod
     def heal(target: Player, amount: float) -> None:
         """Heal a specific target."""
-        past_health = target.health
-        target.health += amount
-        # Increases number of players alive if the player was dead and now is not.
-        if past_health <= 0 < target.health:
-            Player.num_of_players += 1
-
-        # Health can't be greater than max_health. If this happens, health is set to max_health.
-        if target.health > target.stats.max_health:
-            target.health = target.stats.max_health
-        print(f'Healed {amount} HP to {target.name}. Current health: {target.health}')
+        heal_all(target.world, (target,), amount)
 
+    @command('heal')
     def user_potions(self, target: str) -> None:
         """Allows user to use a potion to heal a player. Active."""
-        if Player.potions == 0:
-            print('No potions left!')
+        if self.world.potions == 0:
+            self.world.say('No potions left!')
             return
         try:
-            target = Player.player_dict[target]
+            target = self.world.player_dict[target]
         except KeyError:
-            print('Unknown player')
+            self.world.say('Unknown player')
             return
         if target.health == target.stats.max_health:
-            print('Already full health!')
+            self.world.say('Already full health!')
             return
 
-        Player.potions -= 1
-        Player.heal(target, Player.potions_power)
-        if Player.in_battle:
+        self.world.potions -= 1
+        Player.heal(target, self.world.potions_power)
+        if self.world.in_battle:
             self.can_act -= 1
 
-    @staticmethod
-    def user_show_equipment(player: str) -> None:
+    @command('equipment')
+    def user_show_equipment(self, player: str) -> None:
         """Given a user-selected player, shows equipment of player. Passive."""
         try:
-            player = Player.player_dict[player]
+            player = self.world.player_dict[player]
         except KeyError:
-            print('Unknown player')
+            self.world.say('Unknown player')
             return
 
-        print(f"\n{player.name}\'s Inventory:")
+        self.world.say(f"\n{player.name}\'s Inventory:")
         player.equipment.show_equipment()
 
-    @staticmethod
-    def user_show_inventory() -> None:
+    @command('inventory')
+    def user_show_inventory(self) -> None:
         """Shows shared inventory. Passive."""
-        print(f"\nShared Inventory:"
-              f"\nBag of holding: {Player.inventory}"
-              f"\nPotions: {Player.potions}"
-              f"\nCoins: {Player.coins}\n")
+        self.world.say(f"\nShared Inventory:"
+                       f"\nBag of holding: {self.world.inventory}"
+                       f"\nPotions: {self.world.potions}"
+                       f"\nCoins: {self.world.coins}\n")
 
-    @staticmethod
-    def user_show_stats(player: str) -> None:
+    @command('stats')
+    def user_show_stats(self, player: str) -> None:
         """Given a user-selected player, shows statistics of player. Passive."""
         try:
-            player = Player.player_dict[player]
+            player = self.world.player_dict[player]
         except KeyError:
-            print('Unknown player')
+            self.world.say('Unknown player')
             return
 
-        print(f"\n{player.name}\'s Stats:"
-              f"\n-----------------")
-        player.stats.show_stats()
+        self.world.say(f"\n{player.name}\'s Stats:"
+                       f"\n-----------------")
+        player.stats.show_stats(self.world)
 
-    @staticmethod
-    def pickup_item(item) -> None:  # TODO: Abstract item class.
-        """Picks up an item. Adds coins and potions to class variables."""
-        match item.name.split():
-            case [amount, 'Coins']:
-                Player.coins += int(amount)
-            case [amount, 'Potions']:
-                Player.potions += int(amount)
-            case _:
-                Player.inventory.append(item.name)
-        item_dict.pop(item.name)  # Removes item from dictionary so that it can only be picked up once.
+    @timed('pickup_item')
+    def pickup_item(self, item) -> None:  # TODO: Abstract item class.
+        """Picks up an item into the shared inventory, where coins and potions stack."""
+        self.world.inventory.add(item)
+        # Removes the item from the dictionary so that it can only be picked up once.
+        self.world.unlist_item(item)
 
-    @staticmethod
-    def user_pickup_item(item: str) -> None:
+    @command('pick up')
+    def user_pickup_item(self, item: str) -> None:
         """Picks up a user-selected item. Active."""
         try:
-            item = item_dict[item]
+            item = self.world.item_dict[item][-1]
         except KeyError:
-            print(f'Cannot pickup {item.name}')
+            self.world.say(f'Cannot pickup {item}')
             return
-        print(f'Picked up {item.name}!')
+        self.pickup_item(item)
+        self.world.say(f'Picked up {item.name}!')
+        if self.world.in_battle:
+            self.can_act -= 1
 
-    @staticmethod
-    def loot(target: Entity | Enemy) -> None:
-        """Loots a target's inventory. Adds coins and potions to class variables."""
+    @timed('loot')
+    def loot(self, target: Entity | Enemy) -> None:
+        """Loots a target's inventory into the shared inventory. Items already picked up one by one are left out."""
         for item in target.inventory:
-            Player.pickup_item(item)
-            print(f'Picked up {item.name} from {target}!')
+            if item not in self.world.item_dict.get(item.name, ()):
+                continue
+            self.pickup_item(item)
+            self.world.emit(Loot, item, target)
         target.inventory = []
 
+    @command('loot')
     def user_loot(self, entity: Entity | Enemy) -> None:
-        """Loots a user-selected entity's inventory. Adds coins and potions to class variables. Active."""
+        """Loots a user-selected entity's inventory into the shared inventory. Active."""
         try:
-            entity = Entity.ent_dict[entity]
+            entity = self.world.ent_dict[entity]
         except KeyError:
-            print('Unknown target')
+            self.world.say('Unknown target')
             return
         if entity.health > 0:
-            print(f'Can\'t loot {entity.name} just yet!')
+            self.world.say(f'Can\'t loot {entity.name} just yet!')
             return
 
         self.loot(entity)
-        if Player.in_battle:
+        if self.world.in_battle:
             self.can_act -= 1
 
-    def user_equip(self) -> None:
+    @command('equip')
+    def user_equip(self):
         """
         If in battle, equips a user-selected item to self.
         If not in battle, equips a user-selected item to a user-selected Player.
         Passive.
         """
-        if Player.in_battle:
-            print(f'Equipping to {self.name}...')
+        if self.world.in_battle:
+            self.world.say(f'Equipping to {self.name}...')
             target = self
-            item = input('Item: ')
+            item = yield from self.ask('Item: ')
         else:
-            item = input('Equip: ')
-            target = input('To: ')
+            item = yield from self.ask('Equip: ')
+            target = yield from self.ask('To: ')
             try:
-                target = Player.player_dict[target]
+                target = self.world.player_dict[target]
             except KeyError:
-                print('Unknown player')
+                self.world.say('Unknown player')
                 return
 
-        try:
-            item = EquipItem.equip_dict[item]
-        except KeyError:
-            print('Item does not exist!')
-            return
-
-        if not (item.name in Player.inventory):
-            print('Item not in inventory!')
+        name, item = item, self.world.inventory.get(item)
+        if item is None:
+            self.world.say('Item not in inventory!' if name in catalog else 'Item does not exist!')
         elif not (isinstance(target, item.for_class)):
-            print(f'Can only equip {item.name} to {item.for_class.__name__} class')
+            self.world.say(f'Can only equip {item.name} to {item.for_class.__name__} class')
         else:
             target.equipment.equip(item)
-            print(f'{item.name} equipped!')
 
-    def user_unequip(self) -> None:
+    @command('unequip')
+    def user_unequip(self):
         """
         If in battle, unequips from self the item in a user-selected slot.
         If not in battle, unequips from a user-selected Player the item in a user-selected slot.
         Passive.
         """
-        if Player.in_battle:
-            print(f'Unequiping from {self.name}...')
+        if self.world.in_battle:
+            self.world.say(f'Unequiping from {self.name}...')
             target = self
-            slot = input('Unequip [slot of equipment]: ').lower()
+            slot = (yield from self.ask('Unequip [slot of equipment]: ')).lower()
         else:
-            slot = input('Unequip [slot of equipment]: ').lower()
-            target = input('From: ')
+            slot = (yield from self.ask('Unequip [slot of equipment]: ')).lower()
+            target = yield from self.ask('From: ')
             try:
-                target = Player.player_dict[target]
+                target = self.world.player_dict[target]
             except KeyError:
-                print('Unknown player')
+                self.world.say('Unknown player')
                 return
         try:
             target.equipment.unequip(slot)
         except AttributeError:
-            print('Unknown slot.')
-
-    @staticmethod
-    def revive_all() -> None:
-        """Revives all dead players with a third of their max_health."""
-        for player in Player.player_list:
-            if player.health <= 0:
-                player.health = player.stats.max_health / 3
-                print(f'{player.name} has recuperated!')
-
-    @staticmethod
-    def interaction() -> None:
-        """Players are now outside of battle. Any player is able to act until continue is called."""
-        Player.in_battle = False
-        Player.now_interacting = True
-        while Player.now_interacting:
-            player = input('\nSelect a player: ')
-            try:
-                player = Player.player_dict[player]
-            except KeyError:
-                print('Unknown player')
-                continue
-            print(f'\n{player.name}\'s actions:')
-            # We set can_act to 1. While there are no turns outside of battle, players could be immobilized.
-            player.can_act = 1
-            player.user_actions()
+            self.world.say('Unknown slot.')
 
+    @command('change')
     def user_change_player(self) -> None:
         """Allows user to change player outside of battle."""
-        if Player.in_battle:
-            print('Cannot change players in battle.')
+        if self.world.in_battle:
+            self.world.say('Cannot change players in battle.')
         else:
             self.can_act = 0
 
+    @command('continue')
     def user_continue(self) -> None:
         """Used outside of battle. Ends interaction."""
         # TODO: Should only be ended if they're not endangered. Trapped.
-        if not Player.in_battle:
-            Player.now_interacting = False
+        if not self.world.in_battle:
+            self.world.now_interacting = False
         self.can_act = 0
 
+    @command('hint')
+    def user_hint(self) -> None:
+        """Suggests an action, found by searching the battle ahead. Passive."""
+        from search import hint  # search builds on this module.
+        if not self.world.in_battle:
+            self.world.say('Hints are only given in battle.')
+            return
+        try:
+            answers = hint(self)
+        except ValueError as error:
+            self.world.say(f'No hint: {error}.')
+            return
+        if answers is None:
+            self.world.say('Nothing to do!')
+        elif len(answers) == 1:
+            self.world.say(f'Hint: {answers[0]}')
+        else:
+            self.world.say(f'Hint: {answers[0]}, then target {", ".join(answers[1:])}')
+
+    @command('auto')
+    def user_auto(self) -> None:
+        """Lets a search play self's turns until the battle ends. Passive."""
+        from search import PartySearch, SearchPolicy
+        if not self.world.in_battle:
+            self.world.say('Auto-battle only works in battle.')
+            return
+        try:
+            PartySearch(self.world)
+        except ValueError as error:
+            self.world.say(f'No auto-battle: {error}.')
+            return
+        self.policy = SearchPolicy()
+        self.world.say(f'{self.name} is on auto-battle.')
+
     def __repr__(self):
         return f'{self.__class__.__name__}({self.name})'
 
@@ -461,185 +867,196 @@ class Player:
         return f'{self.name}, the {self.__class__.__name__}'
 
 
+Player.commands = command_registry(Player)  # Subclasses build theirs in __init_subclass__.
+
+
 class Archer(Player):
     """Archer subclass."""
+    __slots__ = ()
+    base_stats = Stats(max_health=80, attack_power=12, speed=5)
+    reach = 6
 
-    def __init__(self, name: str):
-        super().__init__(name)
-        self.stats = Stats(max_health=80, attack_power=12, speed=5)
-        self.equipment = Equipment(self, simple_bow)
+    def __init__(self, world: World, name: str):
+        super().__init__(world, name)
+        self.equipment = Equipment(self, catalog['Simple Bow'])
         self.health = self.stats.max_health
-        Player.potions += 6
+        self.world.potions += 6
 
-    def user_triple_attack(self) -> None:
+    @command('triple')
+    def user_triple_attack(self):
         """Attacks three targets with a sixth of Archer's attack_power."""
         light_atk = round(int(self.stats.attack_power / 6), 1)
-        target1, target2, target3 = input('Target 1: '), input('Target 2: '), input('Target 3: ')
+        target1 = yield from self.ask('Target 1: ')
+        target2 = yield from self.ask('Target 2: ')
+        target3 = yield from self.ask('Target 3: ')
 
         try:
-            target1, target2, target3 = Entity.ent_dict[target1], Entity.ent_dict[target2], Entity.ent_dict[target3]
+            ent_dict = self.world.ent_dict
+            target1, target2, target3 = ent_dict[target1], ent_dict[target2], ent_dict[target3]
         except KeyError:
-            print('Unknown targets!')
+            self.world.say('Unknown targets!')
             return
 
         # Will not waste an action if all enemies are dead.
-        if target1.health <= 0 and target1.health <= 0 and target1.health <= 0:
-            print('All targets already dead!')
+        if target1.health <= 0 and target2.health <= 0 and target3.health <= 0:
+            self.world.say('All targets already dead!')
             return
 
-        self.attack(target1, light_atk)
-        self.attack(target2, light_atk)
-        self.attack(target3, light_atk)
-        if Player.in_battle:
+        damage_all(self.world, (target1, target2, target3), light_atk, self)
+        if self.world.in_battle:
             self.can_act -= 1
 
-    def action_identifier(self, action: str) -> None:
-        """Action identifier. Added 'triple' for user_triple_attack."""
-        match action.split(maxsplit=1):
-            case ['triple']:
-                self.user_triple_attack()
-            case _:
-                Player.action_identifier(self, action)
-
 
 class Knight(Player):
     """Knight subclass."""
+    __slots__ = ()
+    base_stats = Stats(max_health=100, attack_power=15, speed=5)
 
-    def __init__(self, name: str):
-        super().__init__(name)
-        self.stats = Stats(max_health=100, attack_power=15, speed=5)
-        self.equipment = Equipment(self, long_sword, curiass)
+    def __init__(self, world: World, name: str):
+        super().__init__(world, name)
+        self.equipment = Equipment(self, catalog['Long Sword'], catalog['Curiass'])
         self.health = self.stats.max_health
-        self.protecting = None
-        Player.potions += 1
+        self.world.potions += 1
 
+    @command('defend')
     def user_defend(self) -> None:
-        """The next attack is guaranteed to fall on self."""
-        Player.player_list, self.protecting = [self], Player.player_list
-        if Player.in_battle:
+        """Every enemy attack falls on self, until self is damaged."""
+        self.world.effects.add(Guard(self))
+        if self.world.in_battle:
             self.can_act -= 1
 
-    def damage(self, dmg: float, source: Enemy | Player) -> None:
-        """Knight damage method. Cancels defend method."""
-        super().damage(dmg, source)
-        if self.protecting is not None:
-            Player.player_list, self.protecting = self.protecting, None
-
-    def action_identifier(self, action: str) -> None:
-        """Action identifier. Added 'defend' for user_defend."""
-        match action.split(maxsplit=1):
-            case ['defend']:
-                self.user_defend()
-            case _:
-                Player.action_identifier(self, action)
+    def take_damage(self, dmg: float, source) -> None:
+        """Knight take_damage method. Cancels defend method."""
+        super().take_damage(dmg, source)
+        self.world.effects.remove(self, Guard)
 
 
 class Cleric(Player):
+    __slots__ = ()
+    base_stats = Stats(max_health=60, attack_power=5, speed=5, healing_power=5)
 
-    def __init__(self, name: str):
-        super().__init__(name)
-        self.stats = Stats(max_health=60, attack_power=5, speed=5, healing_power=5)
-        self.equipment = Equipment(self, book_of_secrets, curiass, crown_of_life)
+    def __init__(self, world: World, name: str):
+        super().__init__(world, name)
+        self.equipment = Equipment(self, catalog['Book of Secrets'], catalog['Curiass'], catalog['Crown of Life'])
         self.health = self.stats.max_health
-        Player.potions += 1
+        self.world.potions += 1
 
+    @command('purify')
     def user_purify(self) -> None:
         """When in battle, heals each of the Players by self's healing power."""
-        if not Player.in_battle:
-            print(f'{self.name}\'s Purify can only be used in battle')
+        if not self.world.in_battle:
+            self.world.say(f'{self.name}\'s Purify can only be used in battle')
             return
 
-        for player in Player.player_list:
+        wounded = []
+        for player in self.world.player_list:
             if player.health == player.stats.max_health:
-                print(f'{player.name} is already full health!')
-                continue
-            Player.heal(player, self.stats.healing_power)
+                self.world.say(f'{player.name} is already full health!')
+            else:
+                wounded.append(player)
+        if wounded:
+            heal_all(self.world, wounded, self.stats.healing_power)
             self.can_act = 0
 
-    def action_identifier(self, action: str) -> None:
-        """Action identifier. Added 'purify' for user_purify."""
-        match action.split(maxsplit=1):
-            case ['purify']:
-                self.user_purify()
-            case _:
-                Player.action_identifier(self, action)
-
 
 class Entity:
     """Class for environment objects with inventory."""
-    ent_dict = {}  # Translate user inputs.
-    ent_list = []  # TODO: Build environment? Still no use.
+    __slots__ = ('world', 'name', 'health', 'inventory')
 
-    def __init__(self, name: str, health: int, inventory: tuple = ()):
+    def __init__(self, world: World, name: str, health: int, inventory: tuple = ()):
+        self.world = world
         self.name = name
         self.health = health
         self.inventory = inventory
 
-        Entity.ent_dict.update({str(self.name): self})
-        Entity.ent_list.append(self)
+        self.world.ent_dict.update({str(self.name): self})
+        self.world.ent_list.append(self)  # Positions, if any, are kept by world.map. Released by World.release.
+        # Items can only be picked up once self is broken.
+        if health <= 0:
+            self.world.list_items(self)
 
+    @timed('damage')
     def damage(self, dmg: float, source: Enemy | Player) -> None:
         """Runs whenever self takes damage."""
+        whole = self.health > 0
         self.health = round(self.health - dmg, 1)
-        print(f'{self.name} has taken {dmg} points of damage from {source.name}. Remaining durability: {self.health}')
-        if self.health <= 0:
-            print(f'{self.name} has been broken!')
+        self.world.emit(Damage, self, source, dmg, self.health, 'durability')
+        if self.health <= 0 and whole:
+            self.world.list_items(self)
+            self.world.emit(Kill, self, 0, 'environment')
+
+    take_damage = damage  # Entities never dodge.
 
     def __repr__(self):
         return f"Entity({self.name}, {self.health}, {self.inventory})"
 
     def __str__(self):
         return self.name
-    # TODO: When deleted, remove from dictionary
 
 
 class Enemy:
     """Enemy baseclass."""
-    enemy_list = []  # Build battle.
-    num_of_enemies = 0  # Number of alive enemies.
-    defeat = False
+    __slots__ = ('world', 'name', 'base_stats', 'stats', 'health', 'inventory')
+    reach = 1.5
 
-    def __init__(self, name: str, stats: Stats = Stats(max_health=1, attack_power=1, speed=1), inventory: tuple = ()):
+    def __init__(self, world: World, name: str, stats: Stats = Stats(max_health=1, attack_power=1, speed=1),
+                 inventory: tuple = ()):
+        self.world = world
         self.name = name
+        self.base_stats = stats  # Stats without buffs.
         self.stats = stats
         self.health = stats.max_health
         self.inventory = inventory
 
         # TODO: Are two different dicts necessary? For now, ent_dict suffices.
-        Entity.ent_dict.update({str(self.name): self})
-        Entity.ent_list.append(self)
-        Enemy.enemy_list.append(self)
-        Enemy.num_of_enemies += 1
-        Enemy.defeat = False
+        self.world.ent_dict.update({str(self.name): self})
+        self.world.ent_list.append(self)
+        self.world.enemy_list.append(self)
+        self.world.enemies.add(self)
+        self.world.victory = False
+        # Items can only be picked up once self is dead.
+        if self.health <= 0:
+            self.world.list_items(self)
 
     def attack(self, target: Player | Entity | Enemy) -> None:
         if self.health <= 0:
             return
         target.damage(self.stats.attack_power, self)
 
+    def take_turn(self) -> None:
+        """Attacks a random alive player, unless someone protects the party."""
+        self.attack(self.world.enemy_target())
+
+    def restat(self) -> None:
+        """Recomputes stats from base_stats and active buffs. In battle, also moves self in the turn order."""
+        stats = self.base_stats
+        for buff in self.world.effects.buffs(self):
+            stats = buff.upgrades.upgrade_stats(stats)
+        self.stats = stats.rounded() if stats is not self.base_stats else stats
+        if self.world.timeline is not None:
+            self.world.timeline.reschedule(self)
+
+    @timed('damage')
     def damage(self, dmg: float, source: Enemy | Player) -> None:
         """Runs whenever self takes damage."""
-        if isinstance(source, Player):
-            if dodged(self.stats.speed, source.stats.speed):
-                print(f'{source.name} missed!')
-                return
+        if isinstance(source, Player) and self.world.dodge_roll(self, source):
+            self.world.emit(Dodge, self, source, True)
+            return
+        self.take_damage(dmg, source)
+
+    def take_damage(self, dmg: float, source) -> None:
+        """Loses health, without a chance to dodge. Used by damage and by damage over time."""
         self.health = round(self.health - dmg, 1)
-        print(f'{self.name} has taken {dmg} points of damage from {source.name}. Remaining health: {self.health}')
+        self.world.emit(Damage, self, source, dmg, self.health)
 
         if self.health <= 0:
-            Enemy.num_of_enemies -= 1  # Subtracts from the number of alive enemies.
-            print(f'{self.name} has been killed! '
-                  f'{Enemy.num_of_enemies} enemies remaining')
-            if Enemy.num_of_enemies == 0:
-                print('\nVictory!\n')
-                # Loots all enemies.
-                for enemy in Enemy.enemy_list:
-                    Player.loot(enemy)
-
-                # Removes all enemies from dicts.
-                Enemy.enemy_dict = {}
-                Enemy.enemy_list = []
-                Enemy.defeat = True
+            self.world.enemies.kill(self)  # Subtracts from the number of alive enemies.
+            self.world.list_items(self)
+            if isinstance(source, Player):
+                source.kills += 1
+            self.world.emit(Kill, self, self.world.num_of_enemies, 'enemies')
+            if self.world.num_of_enemies == 0:
+                self.world.win(source)
 
     def __repr__(self):
         return f"Enemy({self.name}, {self.stats}, {self.inventory})"
@@ -651,77 +1068,230 @@ class Enemy:
 # TODO: Create special enemies.
 class QueenSpider(Enemy):
     """Queen Spider subclass."""
+    __slots__ = ()
+
+    def __init__(self, world: World, name: str, stats: Stats = Stats(max_health=1, attack_power=1, speed=1),
+                 inventory: tuple = ()):
+        super().__init__(world, name, stats, inventory)
+
+    def paralyze(self, target: Player, turns: int = 3) -> None:
+        """Paralyzes Player for three of its turns."""
+        rounds = turns
+        # If the target already acted this round, its turn of this round does not count.
+        if self.world.timeline is not None and self.world.timeline.acted(target):
+            rounds += 1
+        self.world.effects.add(Paralysis(target, self), rounds)
+        self.world.emit(Paralyze, self, target, turns)
+
+    def take_turn(self) -> None:
+        """Has a probability to paralyze its target instead of attacking it."""
+        target = self.world.enemy_target()
+        if self.world.rng.abilities.randint(0, 3) == 1:
+            self.paralyze(target)
+        else:
+            self.attack(target)
 
-    def __init__(self, name: str, stats: Stats = Stats(max_health=1, attack_power=1, speed=1), inventory: tuple = ()):
-        super().__init__(name, stats, inventory)
+    def __repr__(self):
+        return super().__repr__() + f' Special method: {QueenSpider.paralyze}'
+
+
+class Squad(Enemy):
+    """
+    count identical enemies fighting as one: stats are those of a member, health is pooled.
+    Every max_health of damage kills a whole member, and the survivors attack together, so a squad costs one turn
+    and one target whatever its size.
+    """
+    __slots__ = ()
+
+    def __init__(self, world: World, name: str, stats: Stats = Stats(max_health=1, attack_power=1, speed=1),
+                 inventory: tuple = (), count: int = 1):
+        if count < 1:
+            raise ValueError(f'A squad needs at least one member, not {count}')
+        # Every member drops its collectibles, pooled in one stack. Equipment drops once.
+        inventory = tuple(item.times(count) if isinstance(item, Collectibles) else item for item in inventory)
+        super().__init__(world, name, stats, inventory)
+        self.health = round(stats.max_health * count, 1)
+
+    @property
+    def count(self) -> int:
+        """Alive members. The last one standing may be wounded."""
+        return max(math.ceil(round(self.health / self.base_stats.max_health, 6)), 0)
+
+    def take_damage(self, dmg: float, source) -> None:
+        """Loses pooled health, and the members it no longer covers."""
+        before = self.count
+        super().take_damage(dmg, source)
+        lost = before - self.count
+        if not lost:
+            return
+        if isinstance(source, Player):
+            source.kills += lost - (self.health <= 0)  # Enemy.take_damage counted the last one.
+        if self.health > 0:
+            self.world.emit(Casualties, self, lost, self.count)
 
-    @staticmethod
-    def paralyze(target: Player) -> None:
-        """Paralyzes Player for three turns."""
-        target.can_act = -3
-        print(f'Queen Spider has spewed cobwebs! {target.name} is paralyzed for 3 turns!')
+    def take_turn(self) -> None:
+        """
+        One volley of every member: the protector takes it all, else the members split evenly over the alive players.
+        A targeting roll picks who gets the members left over. Each player takes a single hit, with a single dodge.
+        """
+        world = self.world
+        if world.protector is not None and world.protector.health > 0:
+            targets = [world.protector]
+        else:
+            targets = list(world.party.alive)
+        members = self.count
+        share, left_over = divmod(members, len(targets))
+        first = world.rng.targeting.randint(0, len(targets) - 1)
+        for i, target in enumerate(targets):
+            attackers = share + ((i - first) % len(targets) < left_over)
+            if world.defeat or not attackers or target.health <= 0:
+                continue
+            target.damage(round(self.stats.attack_power * attackers, 1), self)
 
     def __repr__(self):
-        return super().__repr__() + f' Special method: {self.paralyze}'
+        return f"Squad({self.name}, {self.count} x {self.stats}, {self.inventory})"
 
 
-def dodged(self_speed: float, source_speed: float = None) -> bool:
-    """Determines through a uniform distribution whether self dodged the attack."""
+def dodged(self_speed: float, source_speed: float = None, rolls=random) -> bool:
+    """
+    Determines through a uniform distribution whether self dodged the attack.
+    rolls is anything with a uniform(a, b) method, usually the world's dodge stream.
+    """
     # TODO: Traps.
     if source_speed is not None:
         dodge_coefficient = round((self_speed - source_speed) / self_speed, 2)
-        return uniform(-0.75, dodge_coefficient) >= 0
-
+        return rolls.uniform(-0.75, dodge_coefficient) >= 0
+
+
+def dodge_chance(self_speed: float, source_speed: float) -> float:
+    """Probability that dodged(self_speed, source_speed) is True."""
+    dodge_coefficient = round((self_speed - source_speed) / self_speed, 2)
+    # uniform(-0.75, c) >= 0 when the roll is past 0.75 / (c + 0.75).
+    return dodge_coefficient / (dodge_coefficient + 0.75) if dodge_coefficient > 0 else 0.0
+
+
+def dodges(speeds: list[float], source_speed: float, rolls: list[float]) -> list[bool]:
+    """dodged() for many targets at once, one roll each. Coefficients are computed once per distinct speed."""
+    coefficients = {speed: round((speed - source_speed) / speed, 2) for speed in set(speeds)}
+    # Same arithmetic as uniform(-0.75, coefficient), so batches roll exactly like single hits.
+    return [-0.75 + (coefficients[speed] + 0.75) * roll >= 0 for speed, roll in zip(speeds, rolls)]
+
+
+@timed('damage_all', lambda world: world)
+def damage_all(world: World, targets: Iterable, dmg: float, source) -> int:
+    """
+    One action of source dealing dmg to each of targets. Dodge rolls are drawn and tested in bulk, then each hit that
+    lands goes through the target's take_damage, which resolves deaths, and victory or defeat on the deciding hit.
+    A target listed several times is hit several times. Targets that are dead, or die during the pass, are skipped.
+    Returns the number of hits landed.
+    """
+    hits = [target for target in targets if target.health > 0]
+    from_player = isinstance(source, Player)
+    # Rolls like damage() does: players always try to dodge, enemies only players, entities never.
+    rolling = [isinstance(target, Player) or from_player and isinstance(target, Enemy) for target in hits]
+    speeds = [target.stats.speed for target, rolls in zip(hits, rolling) if rolls]
+    dodged_hits = iter(dodges(speeds, source.stats.speed, world.rng.dodge.randoms(len(speeds))) if speeds else ())
+
+    landed = missed = 0
+    for target, rolls in zip(hits, rolling):
+        dodge = rolls and next(dodged_hits)
+        if target.health <= 0:
+            continue
+        if dodge:
+            missed += 1
+            world.emit(Dodge, target, source, isinstance(target, Enemy))
+            continue
+        landed += 1
+        target.take_damage(dmg, source)
+
+    metrics = world.metrics
+    if metrics is not None:
+        metrics.count('dodges', missed)
+        metrics.count('hits', landed)
+    return landed
+
+
+def heal_all(world: World, targets: Iterable[Player], amount: float) -> None:
+    """Heals each of targets by amount, up to their max_health. Dead targets come back to life."""
+    timeline = world.timeline
+    for target in targets:
+        past_health = target.health
+        health = past_health + amount
+        # Increases number of players alive if the player was dead and now is not.
+        if past_health <= 0 < health:
+            world.party.revive(target)
+            # Revived players take turns again from the next round.
+            if timeline is not None:
+                timeline.add(target)
 
-def battle() -> None:
-    """Starts a battle between current players and enemies."""
-    Player.in_battle = True
-    characters = Player.player_list + Enemy.enemy_list
-    # Orders characters on descending order based on their speed.
-    characters.sort(key=lambda char: char.stats.speed, reverse=True)
-    num_of_rounds = 1
+        # Health can't be greater than max_health. If this happens, health is set to max_health.
+        target.health = min(health, target.stats.max_health)
+        world.emit(Heal, target, amount, target.health)
+
+
+def attack_policy(player: Player, prompt: str) -> str:
+    """Headless policy. Attacks the first alive enemy, or continues if there is none."""
+    if prompt == 'Action: ':
+        for enemy in player.world.enemy_list:
+            if enemy.health > 0:
+                return f'attack {enemy.name}'
+        return 'continue'
+    return ''
+
+
+def battle(world: World, headless: bool = False) -> int:
+    """
+    Starts a battle between the world's current players and enemies. Returns the number of rounds played.
+    If headless, only the fight itself runs: no waiting between turns, no revival and no interaction afterwards.
+    Players' actions then come from their policies.
+    """
+    return play(battle_steps(world, headless), world=world)
+
+
+def battle_steps(world: World, headless: bool = False):
+    """Game steps of battle(). Returns the number of rounds played."""
+    world.in_battle = True
+    # Characters act on descending order based on their current speed. Dead characters are dropped.
+    timeline = world.timeline = Timeline(world.player_list + world.enemy_list)
+    num_of_rounds = 0
+    metrics = world.metrics
+    if metrics is not None:
+        metrics.count('battles')
 
     # Until all players or all enemies are defeated.
-    while not Player.defeat and not Enemy.defeat:
-        print(f'\nRound {num_of_rounds}!')
-
-        for character in characters:
-            if Player.defeat or Enemy.defeat:
+    while not world.defeat and not world.victory:
+        num_of_rounds += 1
+        timeline.new_round()
+        world.emit(RoundStart, num_of_rounds)
+        world.effects.tick(num_of_rounds)
+        if metrics is not None:
+            metrics.count('rounds')
+
+        while (character := timeline.pop()) is not None:
+            if world.defeat or world.victory:
                 break
-            input()
-            print(f'\n{character.name}\'s Turn!')
-
-            if character.health <= 0:
-                print(f'\n{character.name} is incapacitated!')
-                continue
+            if not headless:
+                yield PAUSE
+            world.emit(TurnStart, character)
+            if metrics is not None:
+                start, waited = perf_counter(), metrics.input_wait
 
             if isinstance(character, Player):
-                character.user_actions()
+                yield from character.user_actions()
             if isinstance(character, Enemy):
-                # Chooses a random alive player target.
-                target = choice(Player.player_list)
-                while target.health <= 0:
-                    target = choice(Player.player_list)
-                # TODO: Generalize.
-                # If the enemy is a QueenSpider, it has a probability to paralyze the Player instead of attacking it.
-                if isinstance(character, QueenSpider) and randint(0, 3) == 1:
-                    character.paralyze(target)
-                else:
-                    character.attack(target)
-
-        num_of_rounds += 1
-
-    if Player.defeat:
-        print('\nDefeat...')
-    else:
-        Player.revive_all()
-    Player.interaction()
-    input()
-
+                character.take_turn()
+            if metrics is not None:
+                metrics.turn(character, perf_counter() - start - (metrics.input_wait - waited))
+
+    world.effects.clear()
+    world.timeline = None
+    if world.defeat:
+        world.emit(Defeat)
+    world.sink.flush()
+    # A defeated party has no one left to interact with.
+    if not headless and not world.defeat:
+        world.revive_all()
+        yield from world.interaction_steps()
+        yield PAUSE
+    return num_of_rounds
 
-# Base items.
-simple_bow = EquipItem('Simple Bow', EquipSlot.WEAPON, Archer, Upgrades(speed=1.3))
-long_sword = EquipItem('Long Sword', EquipSlot.WEAPON, Knight, Upgrades(attack_power=1.2, speed=0.9))
-curiass = EquipItem('Curiass', EquipSlot.ARMOR, Player, Upgrades(max_health=1.2, speed=0.65))
-book_of_secrets = EquipItem('Book of Secrets', EquipSlot.WEAPON, Cleric, Upgrades(attack_power=1.75, speed=1.25))
-crown_of_life = EquipItem('Crown of Life', EquipSlot.AMULET, Cleric, Upgrades(healing_power=2))
@@ -0,0 +1,254 @@
+from __future__ import annotations
+import struct
+from typing import Callable
+
+from classes import *
+
+# A log is a header followed by fixed-width records and closed by an END record.
+# Several logs can be appended to the same file one after another.
+HEADER = struct.Struct('<4sBxQ')  # Magic, version, RNG seed.
+RECORD = struct.Struct('<BBHHff')  # Code, small field, subject, other, value, value2.
+MAGIC = b'RPGL'
+VERSION = 1
+NONE = 0xFFFF  # No actor or string.
+
+END, COMMAND, STRING = 0, 32, 255
+# STRING records carry the byte length in 'other' and are followed by the padded UTF-8 bytes.
+# Strings are numbered in order of appearance; commands, messages and item names refer to them.
+EVENT_CODES = {RoundStart: 1, TurnStart: 2, Damage: 3, Dodge: 4, Heal: 5, Kill: 6, Immobilized: 7, Revive: 8,
+               Loot: 9, Equip: 10, Unequip: 11, Paralyze: 12, Victory: 13, Defeat: 14, Message: 15,
+               Casualties: 16}
+SIDES = ('party', 'enemies', 'environment')
+DAMAGE_STATS = ('health', 'durability')
+
+
+class ReplayMismatch(Exception):
+    """A replayed battle did something other than what its log recorded."""
+
+
+class CombatLog:
+    """RNG seed of a battle, plus the commands given and the events emitted during it, as binary records."""
+
+    def __init__(self, seed: int, data: bytes = b'') -> None:
+        self.seed = seed
+        self.data = bytearray(data)  # Records, without header nor END.
+        self.strings = []
+        self._string_ids = {}
+        if data:
+            for _ in self.records():  # Reads the string table.
+                pass
+
+    def __len__(self) -> int:
+        """Size of the log in bytes, as saved."""
+        return HEADER.size + len(self.data) + RECORD.size
+
+    def intern(self, text: str) -> int:
+        """Id of a string, which is added to the log the first time it is seen."""
+        string_id = self._string_ids.get(text)
+        if string_id is None:
+            encoded = text.encode()
+            self.append(STRING, other=len(encoded))
+            self.data += encoded.ljust(-(-len(encoded) // RECORD.size) * RECORD.size, b'\0')
+            string_id = self._string_ids[text] = len(self.strings)
+            self.strings.append(text)
+        return string_id
+
+    def find(self, text: str) -> int:
+        """Id of a string already in the log, or NONE."""
+        return self._string_ids.get(text, NONE)
+
+    def append(self, code: int, small: int = 0, subject: int = NONE, other: int = NONE,
+               value: float = 0, value2: float = 0) -> None:
+        self.data += RECORD.pack(code, small, subject, other, value, value2)
+
+    def records(self):
+        """Yields the offset and fields of each record, strings excluded. Fills the string table on the way."""
+        offset = 0
+        while offset < len(self.data):
+            fields = RECORD.unpack_from(self.data, offset)
+            offset += RECORD.size
+            if fields[0] != STRING:
+                yield offset - RECORD.size, fields
+                continue
+            size = fields[3]
+            text = bytes(self.data[offset:offset + size]).decode()
+            offset += -(-size // RECORD.size) * RECORD.size
+            if text not in self._string_ids:
+                self._string_ids[text] = len(self.strings)
+                self.strings.append(text)
+
+    def to_bytes(self) -> bytes:
+        return HEADER.pack(MAGIC, VERSION, self.seed) + self.data + RECORD.pack(END, 0, NONE, NONE, 0, 0)
+
+    def save(self, path: str) -> None:
+        """Appends the log to a file."""
+        with open(path, 'ab') as file:
+            file.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path: str) -> list[CombatLog]:
+        """Every log in a file, in the order they were saved."""
+        with open(path, 'rb') as file:
+            data = file.read()
+        logs, offset = [], 0
+        while offset < len(data):
+            magic, version, seed = HEADER.unpack_from(data, offset)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f'Not a combat log at byte {offset}')
+            start = offset = offset + HEADER.size
+            while data[offset] != END:
+                offset += RECORD.size
+                if data[offset - RECORD.size] == STRING:
+                    size = struct.unpack_from('<H', data, offset - RECORD.size + 4)[0]
+                    offset += -(-size // RECORD.size) * RECORD.size
+            logs.append(cls(seed, data[start:offset]))
+            offset += RECORD.size
+        return logs
+
+
+class _Codec:
+    """Turns events into record fields. Actors are numbered by their place in the world when the battle starts."""
+
+    def __init__(self, world: World, string_id: Callable[[str], int]) -> None:
+        self.actors = {actor: i for i, actor in enumerate(world.player_list + world.ent_list)}
+        self.string_id = string_id
+
+    def actor(self, actor) -> int:
+        return self.actors.get(actor, NONE)
+
+    def fields(self, event) -> tuple:
+        code = EVENT_CODES[type(event)]
+        actor = self.actor
+        match event:
+            case RoundStart(number):
+                return code, 0, NONE, NONE, number, 0
+            case TurnStart(character) | Immobilized(character) | Revive(character):
+                return code, 0, actor(character), NONE, 0, 0
+            case Damage(target, source, amount, health, stat):
+                return code, DAMAGE_STATS.index(stat), actor(target), actor(source), amount, health
+            case Dodge(target, source, missed):
+                return code, missed, actor(target), actor(source), 0, 0
+            case Heal(target, amount, health):
+                return code, 0, actor(target), NONE, amount, health
+            case Kill(target, remaining, side):
+                return code, SIDES.index(side), actor(target), NONE, remaining, 0
+            case Loot(item, source):
+                return code, 0, actor(source), self.string_id(item.name), 0, 0
+            case Equip(player, item) | Unequip(player, item):
+                return code, 0, actor(player), self.string_id(item.name), 0, 0
+            case Casualties(squad, lost, remaining):
+                return code, 0, actor(squad), NONE, lost, remaining
+            case Paralyze(source, target, turns):
+                return code, 0, actor(source), actor(target), turns, 0
+            case Message(text):
+                return code, 0, NONE, self.string_id(text), 0, 0
+        return code, 0, NONE, NONE, 0, 0  # Victory and Defeat.
+
+
+def _answer_from_stdin(player: Player, prompt: str) -> str:
+    return input(prompt)
+
+
+class Recorder:
+    """Sink that records a world's events, and its players' commands, into a log. Passes events on to the old sink."""
+    listening = True
+
+    def __init__(self, world: World, log: CombatLog) -> None:
+        self.world = world
+        self.log = log
+        self.codec = _Codec(world, log.intern)
+        self.inner = world.sink
+        self.policies = [(player, player.policy) for player in world.player_list]
+
+        world.sink = self
+        for player, policy in self.policies:
+            player.policy = self.recording(policy or _answer_from_stdin)
+
+    def recording(self, policy: Callable) -> Callable:
+        def record(player: Player, prompt: str) -> str:
+            answer = policy(player, prompt)
+            self.log.append(COMMAND, subject=self.codec.actor(player), other=self.log.intern(answer))
+            return answer
+        return record
+
+    def write(self, event) -> None:
+        self.log.append(*self.codec.fields(event))
+        if self.inner.listening:
+            self.inner.write(event)
+
+    def flush(self) -> None:
+        self.inner.flush()
+
+    def detach(self) -> None:
+        """Gives the world back its sink and its players back their policies."""
+        self.world.sink = self.inner
+        for player, policy in self.policies:
+            player.policy = policy
+
+
+class Replayer:
+    """Sink and policies that feed a log's commands back to a world and check its events against the log."""
+    listening = True
+
+    def __init__(self, world: World, log: CombatLog) -> None:
+        self.log = log
+        self.codec = _Codec(world, log.find)
+        self.records = log.records()
+        self.count = 0  # Records checked so far.
+
+        world.sink = self
+        for player in world.player_list:
+            player.policy = self.answer
+
+    def next_record(self, replayed) -> tuple:
+        offset, fields = next(self.records, (len(self.log.data), None))
+        if fields is None:
+            raise ReplayMismatch(f'Log ended, but the replay went on with {replayed}')
+        self.count += 1
+        return offset, fields
+
+    def answer(self, player: Player, prompt: str) -> str:
+        offset, (code, _, subject, other, _, _) = self.next_record(f'a command from {player.name}')
+        if code != COMMAND or subject != self.codec.actor(player):
+            raise ReplayMismatch(f'Record {self.count} at byte {offset}: {player.name} was asked for a command')
+        return self.log.strings[other]
+
+    def write(self, event) -> None:
+        offset, fields = self.next_record(event)
+        # Both sides go through float32, so replayed values compare exactly.
+        if RECORD.pack(*fields) != RECORD.pack(*self.codec.fields(event)):
+            raise ReplayMismatch(f'Record {self.count} at byte {offset}: expected {fields}, replayed {event!r}')
+
+    def flush(self) -> None:
+        pass
+
+    def finish(self) -> None:
+        """Checks that the whole log was replayed."""
+        offset, fields = next(self.records, (None, None))
+        if fields is not None:
+            raise ReplayMismatch(f'Replay ended before record {self.count + 1} at byte {offset}')
+
+
+def record_battle(world: World, seed: int) -> CombatLog:
+    """Fights a headless battle in world from the given RNG seed, and returns its log."""
+    log = CombatLog(seed)
+    recorder = Recorder(world, log)
+    world.rng = RNG(seed)
+    try:
+        battle(world, headless=True)
+    finally:
+        recorder.detach()
+    return log
+
+
+def replay(log: CombatLog, build: Callable[[World], None]) -> World:
+    """
+    Re-fights a logged battle at full speed and raises ReplayMismatch as soon as anything differs from the log.
+    build must set up the same encounter as the recorded one into the given world. Returns the replayed world.
+    """
+    world = World(NullSink(), seed=log.seed)
+    build(world)
+    replayer = Replayer(world, log)
+    battle(world, headless=True)
+    replayer.finish()
+    return world
@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+
+class Effect:
+    """
+    A status effect on a combatant. Lasts a number of rounds, or until removed if rounds is None.
+    Subclasses react to being applied, to firing every period rounds and to ending.
+    """
+    __slots__ = ('target', 'source', 'ends', 'active')
+    period = None  # Rounds between firings. None for effects that never fire.
+
+    def __init__(self, target, source=None) -> None:
+        self.target = target
+        self.source = source
+        self.ends = None  # Round at whose start the effect ends. Set by StatusEffects.add.
+        self.active = False  # Effects removed early stay in the wheel and are skipped when their round comes.
+
+    @property
+    def key(self):
+        """Effects with the same key replace each other on a target."""
+        return type(self)
+
+    def apply(self, world) -> None:
+        pass
+
+    def fire(self, world) -> None:
+        pass
+
+    def expire(self, world) -> None:
+        pass
+
+
+class Paralysis(Effect):
+    """The target loses its turns. Checked by Player.user_actions."""
+    __slots__ = ()
+
+
+class Guard(Effect):
+    """The target takes every enemy attack, until it is damaged."""
+    __slots__ = ()
+
+    def apply(self, world) -> None:
+        world.protector = self.target
+
+    def expire(self, world) -> None:
+        if world.protector is self.target:
+            world.protector = None
+
+
+class Buff(Effect):
+    """Multiplies the target's stats by upgrades. Buffs of different names stack."""
+    __slots__ = ('name', 'upgrades')
+
+    def __init__(self, target, upgrades, name: str, source=None) -> None:
+        super().__init__(target, source)
+        self.upgrades = upgrades
+        self.name = name
+
+    @property
+    def key(self):
+        return Buff, self.name
+
+    def apply(self, world) -> None:
+        self.target.restat()
+
+    def expire(self, world) -> None:
+        self.target.restat()
+
+
+class DamageOverTime(Effect):
+    """Deals amount of damage to the target at the start of every round. Cannot be dodged."""
+    __slots__ = ('amount',)
+    period = 1
+
+    def __init__(self, target, amount: float, source=None) -> None:
+        super().__init__(target, source)
+        self.amount = amount
+
+    def fire(self, world) -> None:
+        if self.target.health > 0:
+            self.target.take_damage(self.amount, self.source)
+
+
+class StatusEffects:
+    """
+    Status effects of a world's combatants, on a bucket queue keyed by round number.
+    Each effect only sits in the bucket of the next round it fires or ends in, so a tick costs the effects due
+    that round, not every combatant times every effect. Round numbers are those of the current battle.
+    """
+
+    def __init__(self, world) -> None:
+        self.world = world
+        self.round = 0
+        self._active = {}  # Target -> {effect key: effect}.
+        self._wheel = {}  # Round -> effects due at its start.
+
+    def add(self, effect: Effect, rounds: int = None) -> None:
+        """Applies an effect for a number of rounds, from this one. It ends at the start of round + rounds."""
+        self.remove(effect.target, effect.key)
+        effect.active = True
+        effect.ends = None if rounds is None else self.round + rounds
+        self._active.setdefault(effect.target, {})[effect.key] = effect
+        effect.apply(self.world)
+        self._schedule(effect, self.round)
+
+    def _schedule(self, effect: Effect, now: int) -> None:
+        due = effect.ends
+        if effect.period is not None and (due is None or now + effect.period < due):
+            due = now + effect.period
+        if due is not None:
+            self._wheel.setdefault(due, []).append(effect)
+
+    def get(self, target, key) -> Effect | None:
+        """Active effect of the given key on target, e.g. get(player, Paralysis)."""
+        effects = self._active.get(target)
+        return None if effects is None else effects.get(key)
+
+    def has(self, target, key) -> bool:
+        effects = self._active.get(target)
+        return effects is not None and key in effects
+
+    def buffs(self, target) -> list[Buff]:
+        effects = self._active.get(target)
+        if not effects:
+            return []
+        return [effect for effect in effects.values() if isinstance(effect, Buff)]
+
+    def remove(self, target, key) -> None:
+        """Ends an effect early. Does nothing if target does not have it."""
+        effect = self.get(target, key)
+        if effect is not None:
+            self._end(effect)
+
+    def _end(self, effect: Effect) -> None:
+        effect.active = False
+        effects = self._active[effect.target]
+        del effects[effect.key]
+        if not effects:
+            del self._active[effect.target]
+        effect.expire(self.world)
+
+    def tick(self, round_number: int) -> None:
+        """Starts a round: fires and ends the effects due in it."""
+        self.round = round_number
+        for effect in self._wheel.pop(round_number, ()):
+            if not effect.active:
+                continue
+            if effect.period is not None:
+                effect.fire(self.world)
+                if not effect.active:  # Firing can end it, e.g. by damaging a guarding target.
+                    continue
+            if effect.ends == round_number:
+                self._end(effect)
+            else:
+                self._schedule(effect, round_number)
+
+    def clear(self) -> None:
+        """Ends every effect and goes back to round 0. Called when a battle ends."""
+        for effects in list(self._active.values()):
+            for effect in list(effects.values()):
+                self._end(effect)
+        self._wheel.clear()
+        self.round = 0
@@ -0,0 +1,133 @@
+from __future__ import annotations
+import json
+import os
+from pathlib import Path
+
+from classes import *
+
+# Campaign files are JSON. A campaign has a name, a party and a list of encounters:
+#   party: [{"class": "Archer", "name": "Crystia"}, ...]
+#   encounters: [{
+#       "intro": text said before the battle,
+#       "enemies": [{"type": "QueenSpider" (default "Enemy"), "name": ..., "stats": {...}, "loot": [...]}],
+#                   Squads also take the "count" of members they stand for, and their stats are a member's.
+#       "entities": [{"name": ..., "health": ..., "loot": [...]}],
+#       "blockers": names of entities that must be broken after the battle, "blocked": text said until they are,
+#       "outro": text said once the encounter is cleared}]
+# Loot tables list drops: {"item": catalog name}, {"coins": amount} or {"potions": amount},
+# each with an optional "chance" of dropping, rolled from the world's loot stream.
+
+
+class Drop(NamedTuple):
+    item: EquipItem | Collectibles  # Shared by every world. Items are never modified.
+    chance: float = 1
+
+
+def compile_loot(specs) -> tuple[Drop, ...]:
+    drops = []
+    for spec in specs:
+        if 'item' in spec:
+            item = catalog[spec['item']]
+        elif 'coins' in spec:
+            item = Collectibles(spec['coins'], 'c')
+        elif 'potions' in spec:
+            item = Collectibles(spec['potions'], 'p')
+        else:
+            raise ValueError(f'Unknown drop: {spec}')
+        drops.append(Drop(item, spec.get('chance', 1)))
+    return tuple(drops)
+
+
+def roll_loot(world: World, drops: tuple[Drop, ...]) -> tuple:
+    """Items that drop this time. Certain drops take no roll."""
+    return tuple(drop.item for drop in drops if drop.chance >= 1 or world.rng.loot.random() < drop.chance)
+
+
+class EncounterTemplate:
+    """An encounter compiled from its data: classes, Stats and loot resolved, ready to be set up in any world."""
+    __slots__ = ('intro', 'enemies', 'entities', 'blockers', 'blocked', 'outro')
+
+    def __init__(self, spec: dict) -> None:
+        enemy_classes = {cls.__name__: cls for cls in subclasses(Enemy)}
+        self.intro = spec.get('intro')
+        self.enemies = tuple((enemy_classes[enemy.get('type', 'Enemy')], enemy['name'], Stats(**enemy['stats']),
+                              compile_loot(enemy.get('loot', ())),
+                              {'count': enemy['count']} if 'count' in enemy else {})  # Squads only.
+                             for enemy in spec.get('enemies', ()))
+        self.entities = tuple((entity['name'], entity['health'], compile_loot(entity.get('loot', ())))
+                              for entity in spec.get('entities', ()))
+        self.blockers = tuple(spec.get('blockers', ()))
+        self.blocked = spec.get('blocked')
+        self.outro = spec.get('outro')
+
+    def setup(self, world: World) -> None:
+        """Places the encounter's enemies and entities in world."""
+        for cls, name, stats, loot, options in self.enemies:
+            cls(world, name, stats, roll_loot(world, loot), **options)
+        for name, health, loot in self.entities:
+            Entity(world, name, health, roll_loot(world, loot))
+
+    def play(self, world: World):
+        """
+        Game steps of the encounter: the battle, then interaction until every blocker is broken.
+        Its enemies and entities, and the items left on them, are released once it ends.
+        """
+        with world.encounter():
+            if self.intro:
+                world.say(self.intro)
+            self.setup(world)
+            if self.enemies:
+                yield from battle_steps(world)
+            else:  # Nothing to fight: straight to interaction.
+                yield from world.interaction_steps()
+            if world.defeat:
+                return
+            while any(world.ent_dict[name].health > 0 for name in self.blockers):
+                world.say(self.blocked)
+                yield from world.interaction_steps()
+            if self.outro:
+                world.say(self.outro)
+
+
+class CampaignTemplate:
+    """A compiled campaign. Encounters are only compiled when a session first reaches them, then kept."""
+
+    def __init__(self, spec: dict) -> None:
+        classes = {cls.__name__: cls for cls in subclasses(Player)}
+        self.name = spec.get('name')
+        self.party = tuple((classes[player['class']], player['name']) for player in spec['party'])
+        self._specs = spec['encounters']
+        self._encounters = [None] * len(self._specs)
+
+    def __len__(self) -> int:
+        return len(self._specs)
+
+    def encounter(self, index: int) -> EncounterTemplate:
+        encounter = self._encounters[index]
+        if encounter is None:
+            encounter = self._encounters[index] = EncounterTemplate(self._specs[index])
+            self._specs[index] = None  # Its data is not needed anymore.
+        return encounter
+
+    def play(self, world: World):
+        """Game steps of the whole campaign, played by a new party in world. Ends at the first defeat."""
+        for cls, name in self.party:
+            cls(world, name)
+        for index in range(len(self)):
+            yield from self.encounter(index).play(world)
+            if world.defeat:
+                return
+
+
+_campaigns = {}  # path -> (modification time, CampaignTemplate).
+
+
+def load_campaign(path: str | Path) -> CampaignTemplate:
+    """Compiled campaign of a file. Files are parsed once, and again only if they change."""
+    path = os.path.abspath(path)
+    modified = os.stat(path).st_mtime_ns
+    cached = _campaigns.get(path)
+    if cached is None or cached[0] != modified:
+        with open(path) as file:
+            cached = _campaigns[path] = (modified, CampaignTemplate(json.load(file)))
+    return cached[1]
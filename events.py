@@ -0,0 +1,221 @@
+from __future__ import annotations
+import sys
+from typing import NamedTuple
+
+
+# Game events. Each renders as the text the game has always printed for it.
+
+class Message(NamedTuple):
+    """Plain game text: menus, feedback and errors."""
+    text: str
+
+    def __str__(self) -> str:
+        return self.text
+
+
+class RoundStart(NamedTuple):
+    number: int
+
+    def __str__(self) -> str:
+        return f'\nRound {self.number}!'
+
+
+class TurnStart(NamedTuple):
+    character: object
+
+    def __str__(self) -> str:
+        return f'\n{self.character.name}\'s Turn!'
+
+
+class Damage(NamedTuple):
+    target: object
+    source: object
+    amount: float
+    health: float  # Remaining health, or durability for entities.
+    stat: str = 'health'
+
+    def __str__(self) -> str:
+        # Damage over time may have no source.
+        source = 'over time' if self.source is None else f'from {self.source.name}'
+        return (f'{self.target.name} has taken {self.amount} points of damage {source}. '
+                f'Remaining {self.stat}: {self.health}')
+
+
+class Dodge(NamedTuple):
+    target: object
+    source: object
+    missed: bool = False  # Told from the attacker's side.
+
+    def __str__(self) -> str:
+        if self.missed:
+            return f'{self.source.name} missed!'
+        return f'{self.target.name} has dodged the attack!'
+
+
+class Heal(NamedTuple):
+    target: object
+    amount: float
+    health: float
+
+    def __str__(self) -> str:
+        return f'Healed {self.amount} HP to {self.target.name}. Current health: {self.health}'
+
+
+class Kill(NamedTuple):
+    target: object
+    remaining: int  # Alive members left on the target's side.
+    side: str  # 'party', 'enemies' or 'environment'.
+
+    def __str__(self) -> str:
+        if self.side == 'party':
+            text = f'{self.target.name} has been incapacitated! {self.remaining} party members remaining'
+            if self.remaining == 0:
+                text += '\nAll party members incapacitated!'
+            return text
+        if self.side == 'enemies':
+            return f'{self.target.name} has been killed! {self.remaining} enemies remaining'
+        return f'{self.target.name} has been broken!'
+
+
+class Casualties(NamedTuple):
+    """Members of a squad killed by a hit it survived."""
+    squad: object
+    lost: int
+    remaining: int
+
+    def __str__(self) -> str:
+        return f'{self.lost} of {self.squad.name} have fallen! {self.remaining} remaining'
+
+
+class Immobilized(NamedTuple):
+    character: object
+
+    def __str__(self) -> str:
+        return f'{self.character.name} is immobilized!'
+
+
+class Revive(NamedTuple):
+    target: object
+
+    def __str__(self) -> str:
+        return f'{self.target.name} has recuperated!'
+
+
+class Loot(NamedTuple):
+    item: object
+    source: object
+
+    def __str__(self) -> str:
+        return f'Picked up {self.item.name} from {self.source}!'
+
+
+class Equip(NamedTuple):
+    player: object
+    item: object
+
+    def __str__(self) -> str:
+        return f'{self.item.name} equipped!'
+
+
+class Unequip(NamedTuple):
+    player: object
+    item: object
+
+    def __str__(self) -> str:
+        return f'Unequipped {self.item}'
+
+
+class Paralyze(NamedTuple):
+    source: object
+    target: object
+    turns: int
+
+    def __str__(self) -> str:
+        return f'{self.source.name} has spewed cobwebs! {self.target.name} is paralyzed for {self.turns} turns!'
+
+
+class Victory(NamedTuple):
+
+    def __str__(self) -> str:
+        return '\nVictory!\n'
+
+
+class Defeat(NamedTuple):
+
+    def __str__(self) -> str:
+        return '\nDefeat...'
+
+
+# Sinks. Any object with a listening flag and write(event) and flush() methods works.
+
+class ConsoleSink:
+    """Default sink. Prints every event as game text to stdout."""
+    listening = True
+
+    @staticmethod
+    def write(event) -> None:
+        print(event)
+
+    @staticmethod
+    def flush() -> None:
+        pass
+
+
+class NullSink:
+    """Discards every event. Worlds do not even build events for it, so it costs nothing."""
+    listening = False
+
+    @staticmethod
+    def write(event) -> None:
+        pass
+
+    @staticmethod
+    def flush() -> None:
+        pass
+
+
+class ListSink:
+    """Keeps every event in a list."""
+    listening = True
+
+    def __init__(self) -> None:
+        self.events = []
+
+    def write(self, event) -> None:
+        self.events.append(event)
+
+    def flush(self) -> None:
+        pass
+
+    @property
+    def messages(self) -> list[str]:
+        """Game text of every kept event."""
+        return [str(event) for event in self.events]
+
+
+class BufferedSink:
+    """Renders events as game text and writes them to a stream in batches of batch_size, or when flushed."""
+    listening = True
+
+    def __init__(self, stream=None, batch_size: int = 256) -> None:
+        self.stream = stream  # None means the current sys.stdout.
+        self.batch_size = batch_size
+        self.buffer = []
+
+    def write(self, event) -> None:
+        self.buffer.append(str(event))
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.buffer:
+            return
+        stream = sys.stdout if self.stream is None else self.stream
+        stream.write('\n'.join(self.buffer) + '\n')
+        self.buffer.clear()
+
+    def __enter__(self) -> BufferedSink:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.flush()
@@ -0,0 +1,139 @@
+from __future__ import annotations
+from typing import Iterable
+
+
+class Inventory:
+    """
+    Multiset of items. Adding, removing and finding an item cost O(1) however big the bag grows.
+    Catalog items are keyed by item_id, and items made on the fly by themselves, so items that share a name, e.g. a
+    tuned copy and its catalog original, are told apart. Names are indexed too, for lookups by what the user types.
+    Equip items are also indexed by equip slot and by the class they are for.
+    Collectibles stack natively: every potion picked up lands in a single 'Potions' entry, and every coin in 'Coins'.
+    """
+
+    def __init__(self, items: Iterable = ()) -> None:
+        self.items = {}  # key -> item, for every entry but stacks of collectibles. In order of arrival.
+        self.counts = {}  # key -> count. Same order. Stacks are keyed by their kind.
+        self._by_name = {}  # name -> {key: None}. Dicts as ordered sets.
+        self._by_slot = {}  # equip_slot -> {key: None}
+        self._by_class = {}  # for_class -> {key: None}
+        self._total = 0
+        for item in items:
+            self.add(item)
+
+    @staticmethod
+    def key(item):
+        """Key of an item's entry: its kind for collectibles, its item_id for catalog items, else the item itself."""
+        kind = getattr(item, 'kind', None)
+        if kind is not None:
+            return kind
+        item_id = getattr(item, 'item_id', None)
+        return item if item_id is None else item_id
+
+    def _find(self, item):
+        """Key of an item given by itself or by name. The first entry of that name if several share it."""
+        if not isinstance(item, str):
+            return self.key(item)
+        keys = self._by_name.get(item)
+        return next(iter(keys)) if keys else item
+
+    def _name(self, key) -> str:
+        item = self.items.get(key)
+        return key if item is None else item.name
+
+    def __len__(self) -> int:
+        """Number of distinct entries."""
+        return len(self.counts)
+
+    def __contains__(self, item) -> bool:
+        """Whether an item, given by itself or by name, is in the inventory."""
+        return self._find(item) in self.counts
+
+    def __iter__(self):
+        """Names of the entries. Entries that share a name repeat it."""
+        return (self._name(key) for key in self.counts)
+
+    def __getitem__(self, item) -> int:
+        """How many of an item, given by itself or by name, there are. 0 if none."""
+        return self.counts.get(self._find(item), 0)
+
+    def __setitem__(self, name: str, count: int) -> None:
+        """Sets how many of name there are. Used for stacks, e.g. inventory['Potions'] -= 1."""
+        difference = count - self[name]
+        if difference > 0:
+            key = self._find(name)
+            self._add(key, name, self.items.get(key), difference)
+        elif difference < 0:
+            self.remove(name, -difference)
+
+    def total(self) -> int:
+        """Number of single items, stacks included."""
+        return self._total
+
+    def add(self, item, count: int = 1) -> None:
+        """Adds count of an item. Collectibles add their amount to the stack of their kind."""
+        kind = getattr(item, 'kind', None)
+        if kind is not None:
+            self._add(kind, kind, None, item.amount * count)
+        else:
+            self._add(self.key(item), item.name, item, count)
+
+    def _add(self, key, name: str, item, count: int) -> None:
+        if key not in self.counts:
+            self.counts[key] = 0
+            self._by_name.setdefault(name, {})[key] = None
+            if item is not None:
+                self.items[key] = item
+                for index in self._indexes(item):
+                    index[key] = None
+        self.counts[key] += count
+        self._total += count
+
+    def remove(self, item, count: int = 1) -> None:
+        """Removes count of an item, given by itself or by name. Raises ValueError if there are not that many."""
+        key = self._find(item)
+        held = self.counts.get(key, 0)
+        if held < count:
+            raise ValueError(f'Only {held} of {item if isinstance(item, str) else item.name} in inventory')
+        self._total -= count
+        if held > count:
+            self.counts[key] = held - count
+            return
+        del self.counts[key]
+        name = self._name(key)
+        keys = self._by_name[name]
+        del keys[key]
+        if not keys:
+            del self._by_name[name]
+        for index in self._indexes(self.items.pop(key, None)):
+            del index[key]
+
+    def _indexes(self, item):
+        """Secondary indexes that item belongs to."""
+        slot = getattr(item, 'equip_slot', None)
+        if slot is not None:
+            yield self._by_slot.setdefault(slot, {})
+        for_class = getattr(item, 'for_class', None)
+        if for_class is not None:
+            yield self._by_class.setdefault(for_class, {})
+
+    def get(self, name: str, default=None):
+        """Item of the given name, or default. The first to arrive if several share it."""
+        return self.items.get(self._find(name), default)
+
+    def in_slot(self, equip_slot: str) -> list:
+        """Items that go in the given equip slot."""
+        return [self.items[key] for key in self._by_slot.get(equip_slot, ())]
+
+    def for_class(self, cls: type) -> list:
+        """Items that can be equipped by cls, including those made for its base classes."""
+        return [self.items[key] for klass in cls.__mro__ for key in self._by_class.get(klass, ())]
+
+    def __str__(self) -> str:
+        """Names of the items, without stacks. Repeated items show their count."""
+        return str([item.name if self.counts[key] == 1 else f'{item.name} x{self.counts[key]}'
+                    for key, item in self.items.items()])
+
+    def __repr__(self) -> str:
+        counts = [(self._name(key), count) for key, count in self.counts.items()]
+        return f'Inventory({counts})'
@@ -0,0 +1,84 @@
+from __future__ import annotations
+import gc
+import sys
+import tracemalloc
+
+from classes import *
+from encounters import EncounterTemplate
+
+# A small encounter for the soak test: a spider and a vase, both with loot, some of which is left behind.
+SOAK_ENCOUNTER = {
+    'enemies': [{'name': 'Swamp Spider', 'stats': {'max_health': 20, 'attack_power': 5, 'speed': 5.5},
+                 'loot': [{'coins': 5}, {'item': 'Long Bow', 'chance': 0.5}]}],
+    'entities': [{'name': 'Vase', 'health': 1, 'loot': [{'potions': 1}, {'item': 'Pendant of Valor'}]}],
+}
+# Traced bytes the soak may still grow by after its first checkpoint, which warms up caches and free lists.
+MAX_SOAK_GROWTH = 64 * 1024
+
+
+def bytes_per_combatant(count: int = 10_000) -> tuple[float, float]:
+    """Average memory taken by an Enemy with its own Stats, and by an Archer with its Equipment and Stats."""
+    results = []
+    for make in (lambda world, i: Enemy(world, f'Spider {i}', Stats(max_health=20, attack_power=10, speed=5.5)),
+                 lambda world, i: Archer(world, f'Archer {i}')):
+        world = World(NullSink())
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        combatants = [make(world, i) for i in range(count)]
+        after = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        # Names, the world's registries and the list above grow with every combatant too. They are counted.
+        results.append((after - before) / len(combatants))
+    return results[0], results[1]
+
+
+def soak(encounters: int = 100_000, checkpoints: int = 10) -> list[int]:
+    """
+    Plays the same encounter over and over in one world, and returns the traced memory at each checkpoint.
+    Encounters release what they create, so it stays flat however many are played.
+    """
+    from bench import adventure_bot
+    world = World(NullSink(), seed=0)
+    for cls, name in ((Archer, 'Crystia'), (Knight, 'Ayame'), (Cleric, 'Yana')):
+        cls(world, name)
+    template = EncounterTemplate(SOAK_ENCOUNTER)
+    answer = adventure_bot(world)
+
+    def pick_up(prompt: Prompt) -> str:
+        # Leaves the vase's items on it half of the time, for the encounter to release.
+        if prompt.text == 'Action: ' and world.item_dict and world.rng.loot.random() < 0.5:
+            return f'pick up {next(iter(world.item_dict))}'
+        return answer(prompt)
+
+    gc.collect()
+    tracemalloc.start()
+    traced = []
+    for played in range(encounters):
+        play(template.play(world), pick_up)
+        world.revive_all()
+        for player in world.player_list:
+            player.health = player.stats.max_health
+        if (played + 1) % (encounters // checkpoints) == 0:
+            gc.collect()
+            traced.append(tracemalloc.get_traced_memory()[0])
+    tracemalloc.stop()
+    return traced
+
+
+def main() -> int:
+    enemy, archer = bytes_per_combatant()
+    print(f'Enemy: {enemy:.0f} bytes per combatant')
+    print(f'Archer: {archer:.0f} bytes per combatant')
+    traced = soak()
+    print('Soak, traced bytes every 10k encounters:', ', '.join(f'{size:,}' for size in traced))
+    growth = max(traced) - traced[0]
+    print(f'Growth after the first checkpoint: {growth:,} bytes')
+    if growth > MAX_SOAK_GROWTH:
+        print(f'LEAK soak grew by {growth:,} bytes > {MAX_SOAK_GROWTH:,} after warm-up')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,153 @@
+from __future__ import annotations
+import os
+from bisect import bisect_left
+from time import perf_counter
+
+from classes import *
+
+# Upper bounds of the latency buckets, in seconds: 1 us to about 4 s, each 4 times the last.
+BUCKETS = tuple(1e-6 * 4 ** i for i in range(12))
+
+
+class Histogram:
+    """Latency histogram with fixed buckets, as Prometheus expects them."""
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(BUCKETS) + 1)  # The last bucket is +Inf.
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile. Inf if it is past the last bucket."""
+        rank, seen = q * self.count, 0
+        for bound, count in zip(BUCKETS + (float('inf'),), self.counts):
+            seen += count
+            if seen >= rank and seen:
+                return bound
+        return 0.0
+
+
+class Metrics:
+    """
+    Timings and counters of one world. Attached with enable(), which is the only thing that turns them on:
+    functions decorated with classes.timed check their world's metrics when called, so worlds without metrics only
+    pay that check.
+    """
+
+    def __init__(self) -> None:
+        self.started = perf_counter()
+        self.phases = {}  # Phase name -> Histogram.
+        self.counters = {}  # Counter name -> value.
+        self.input_wait = 0.0  # Seconds spent waiting for answers: users, or policies.
+        self.compute = 0.0  # Seconds spent running turns, waits excluded.
+        self.timing = False  # Whether a timed call is running. Calls it makes are part of it.
+
+    def time(self, phase: str, function, *args):
+        """Runs function(*args), timed as phase. Timed methods hand themselves over when nothing else is timed."""
+        self.timing = True
+        start = perf_counter()
+        try:
+            return function(*args)
+        finally:
+            self.observe(phase, perf_counter() - start)
+            self.timing = False
+
+    def observe(self, phase: str, seconds: float) -> None:
+        histogram = self.phases.get(phase)
+        if histogram is None:
+            histogram = self.phases[phase] = Histogram()
+        histogram.observe(seconds)
+
+    def count(self, name: str, amount: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def waited(self, seconds: float) -> None:
+        self.input_wait += seconds
+        self.observe('input_wait', seconds)
+
+    def turn(self, character, seconds: float) -> None:
+        """A turn took seconds of computing."""
+        self.compute += seconds
+        self.count('turns')
+        self.observe('player_turn' if isinstance(character, Player) else 'enemy_turn', seconds)
+
+    def snapshot(self, world: World = None) -> dict:
+        """Everything measured so far, plus the per-player counters of world, as plain data."""
+        elapsed = perf_counter() - self.started
+        turns = self.counters.get('turns', 0)
+        snapshot = {
+            'elapsed': elapsed,
+            'input_wait': self.input_wait,
+            'compute': self.compute,
+            'turns_per_second': turns / elapsed if elapsed else 0.0,
+            'compute_turns_per_second': turns / self.compute if self.compute else 0.0,
+            'counters': dict(self.counters),
+            'phases': {phase: {'count': histogram.count, 'sum': histogram.sum,
+                               'p50': histogram.quantile(0.5), 'p99': histogram.quantile(0.99)}
+                       for phase, histogram in self.phases.items()},
+        }
+        if world is not None:
+            snapshot['kills'] = {player.name: player.kills for player in world.player_list}
+        return snapshot
+
+    def samples(self, world: World = None):
+        """Yields (family, type, sample suffix, labels, value) in Prometheus terms."""
+        yield 'rpg_elapsed_seconds', 'gauge', '', {}, perf_counter() - self.started
+        yield 'rpg_input_wait_seconds_total', 'counter', '', {}, self.input_wait
+        yield 'rpg_compute_seconds_total', 'counter', '', {}, self.compute
+        for name, value in self.counters.items():
+            yield f'rpg_{name}_total', 'counter', '', {}, value
+        for phase, histogram in self.phases.items():
+            cumulative = 0
+            for bound, count in zip(BUCKETS + (float('inf'),), histogram.counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else f'{bound:g}'
+                yield 'rpg_phase_seconds', 'histogram', '_bucket', {'phase': phase, 'le': le}, cumulative
+            yield 'rpg_phase_seconds', 'histogram', '_sum', {'phase': phase}, histogram.sum
+            yield 'rpg_phase_seconds', 'histogram', '_count', {'phase': phase}, histogram.count
+        if world is not None:
+            for player in world.player_list:
+                yield 'rpg_player_kills', 'gauge', '', {'player': player.name}, player.kills
+
+
+def escape(label_value) -> str:
+    """Label value as Prometheus quotes it: backslashes, double quotes and newlines escaped."""
+    return str(label_value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def prometheus(sessions) -> str:
+    """
+    Prometheus text format for (labels, metrics, world) triples, e.g. one per session with a session label.
+    world can be None.
+    """
+    families = {}  # Family -> (type, lines), so each family is written once whatever the number of sessions.
+    for labels, metrics, world in sessions:
+        for family, kind, suffix, sample_labels, value in metrics.samples(world):
+            text = ','.join(f'{key}="{escape(value_)}"' for key, value_ in {**labels, **sample_labels}.items())
+            lines = families.setdefault(family, (kind, []))[1]
+            lines.append(f'{family}{suffix}{{{text}}} {value}' if text else f'{family}{suffix} {value}')
+    output = []
+    for family, (kind, lines) in families.items():
+        output.append(f'# TYPE {family} {kind}')
+        output.extend(lines)
+    return '\n'.join(output) + '\n'
+
+
+def write_prometheus(path: str, sessions) -> None:
+    """Writes prometheus(sessions) to a file, atomically, for a local scraper to pick up."""
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w') as file:
+        file.write(prometheus(sessions))
+    os.replace(temporary, path)
+
+
+def enable(world: World, metrics: Metrics = None) -> Metrics:
+    """Turns metrics on for world, and returns them."""
+    world.metrics = Metrics() if metrics is None else metrics
+    return world.metrics
@@ -0,0 +1,80 @@
+from __future__ import annotations
+import random
+from itertools import islice
+
+try:
+    import numpy as np
+except ImportError:  # Rolls then come from the standard library.
+    np = None
+
+
+class RollStream:
+    """
+    Random rolls taken one by one from a buffer that is refilled in bulk.
+    The generator is only built on the first refill, and buffers start small and double on each refill,
+    so idle worlds stay cheap and busy ones refill rarely.
+    """
+
+    def __init__(self, seed: int | list[int], key: int, min_size: int = 64, max_size: int = 8192) -> None:
+        self.seed = seed
+        self.key = key  # Tells streams of the same seed apart.
+        self.generator = None  # numpy Generator, or random.Random without numpy.
+        self.size = min_size
+        self.max_size = max_size
+        self._rolls = iter(())
+
+    def _refill(self) -> None:
+        if np is not None:
+            if self.generator is None:
+                # Same generator as the key-th child of SeedSequence(seed).spawn().
+                seed_seq = np.random.SeedSequence(self.seed, spawn_key=(self.key,))
+                self.generator = np.random.Generator(np.random.PCG64(seed_seq))
+            rolls = self.generator.random(self.size).tolist()
+        else:
+            if self.generator is None:
+                self.generator = random.Random(None if self.seed is None else f'{self.seed}:{self.key}')
+            rolls = [self.generator.random() for _ in range(self.size)]
+        self._rolls = iter(rolls)
+        self.size = min(self.size * 2, self.max_size)
+
+    def random(self) -> float:
+        """Next roll in [0, 1)."""
+        try:
+            return next(self._rolls)
+        except StopIteration:
+            self._refill()
+            return next(self._rolls)
+
+    def randoms(self, n: int) -> list[float]:
+        """Next n rolls at once, the same n calls to random() would give."""
+        rolls = list(islice(self._rolls, n))
+        while len(rolls) < n:
+            self._refill()
+            rolls += islice(self._rolls, n - len(rolls))
+        return rolls
+
+    def uniform(self, a: float, b: float) -> float:
+        return a + (b - a) * self.random()
+
+    def randint(self, a: int, b: int) -> int:
+        """Random integer in [a, b], both included."""
+        return a + int(self.random() * (b - a + 1))
+
+    def choice(self, seq):
+        return seq[int(self.random() * len(seq))]
+
+
+class RNG:
+    """
+    Random numbers of a game or simulation. Each kind of roll has its own independent stream,
+    so adding rolls of one kind never shifts the others. Same seed, same rolls.
+    """
+    streams = ('dodge', 'targeting', 'abilities', 'loot')
+
+    def __init__(self, seed: int | list[int] = None) -> None:
+        if seed is None and np is not None:
+            seed = np.random.SeedSequence().entropy  # Fresh, but fixed for every stream of this RNG.
+        elif seed is None:
+            seed = random.getrandbits(128)
+        self.seed = seed
+        self.dodge, self.targeting, self.abilities, self.loot = (RollStream(seed, key) for key in range(len(RNG.streams)))
@@ -0,0 +1,62 @@
+from __future__ import annotations
+import random
+
+
+class Roster:
+    """
+    Alive and dead members of one faction.
+    Alive members are kept in a list with a position index, so deaths, revivals and random picks all cost O(1).
+    """
+
+    def __init__(self) -> None:
+        self.alive = []
+        self._position = {}  # Member -> index in alive.
+        self.dead = {}  # Member -> None, in order of death. Dicts as ordered sets.
+
+    def __len__(self) -> int:
+        """Number of alive members."""
+        return len(self.alive)
+
+    def is_alive(self, member) -> bool:
+        return member in self._position
+
+    def add(self, member) -> None:
+        """Registers a new member. Members start alive unless their health says otherwise."""
+        if member.health is not None and member.health <= 0:
+            self.dead[member] = None
+        else:
+            self._position[member] = len(self.alive)
+            self.alive.append(member)
+
+    def kill(self, member) -> None:
+        """Moves an alive member to the dead. The last alive member takes its place in the list."""
+        position = self._position.pop(member, None)
+        if position is None:
+            return
+        last = self.alive.pop()
+        if last is not member:
+            self.alive[position] = last
+            self._position[last] = position
+        self.dead[member] = None
+
+    def revive(self, member) -> None:
+        """Moves a dead member back to the alive."""
+        if member not in self.dead:
+            return
+        del self.dead[member]
+        self._position[member] = len(self.alive)
+        self.alive.append(member)
+
+    def discard(self, member) -> None:
+        """Forgets a member, alive or dead."""
+        self.kill(member)
+        self.dead.pop(member, None)
+
+    def choice(self, rolls=random):
+        """Random alive member. rolls is anything with a choice(seq) method, usually a world's targeting stream."""
+        return rolls.choice(self.alive)
+
+    def clear(self) -> None:
+        self.alive.clear()
+        self._position.clear()
+        self.dead.clear()
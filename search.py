@@ -0,0 +1,274 @@
+from __future__ import annotations
+from itertools import combinations_with_replacement, product
+from time import perf_counter
+
+from classes import *
+
+# Search states are tuples, so forking one only rebuilds what a move changes and the rest is shared:
+#   (turn, health of every combatant, paralysed turns left of every combatant, protector or -1, potions)
+# Combatants are indexed in turn order, fastest first.
+
+
+class Move(NamedTuple):
+    verb: str  # 'attack', 'heal', 'triple', 'defend' or 'purify'.
+    targets: tuple[int, ...] = ()
+
+
+class OutOfTime(Exception):
+    pass
+
+
+class PartySearch:
+    """
+    Expectimax over a world's ongoing battle, from the turn of one player: players pick the move that maximizes the
+    expected score, dodges, enemy targets and paralysis are averaged over with the odds battle() rolls them with.
+    Deepens one turn at a time until the time budget runs out, and keeps the best move of the deepest finished search.
+    States reached through different moves or rolls are merged in a transposition table.
+    Buffs and damage over time are left out, and revived players act again from their next turn.
+    Squads are not modelled, and rejected.
+    """
+
+    def __init__(self, world: World, budget: float = 0.05, max_depth: int = 20) -> None:
+        if any(isinstance(enemy, Squad) for enemy in world.enemy_list):
+            raise ValueError('Battles against squads cannot be searched')
+        self.world = world
+        self.budget = budget  # Seconds.
+        self.max_depth = max_depth  # Turns searched ahead, at most.
+        characters = sorted(world.player_list + world.enemy_list, key=lambda char: char.stats.speed, reverse=True)
+        self.characters = characters
+        self.players = tuple(i for i, char in enumerate(characters) if isinstance(char, Player))
+        self.enemies = tuple(i for i, char in enumerate(characters) if isinstance(char, Enemy))
+        self.index = {char: i for i, char in enumerate(characters)}
+        self.max_health = tuple(char.stats.max_health for char in characters)
+        speeds = [char.stats.speed for char in characters]
+        self.dodge = [[dodge_chance(target, source) for source in speeds] for target in speeds]
+        self._table = {}  # (state, depth) -> expected score.
+        self._deadline = None
+        self.nodes = 0  # States expanded by the last search.
+
+    def state(self, player: Player) -> tuple:
+        """Current state of the world, on player's turn."""
+        world = self.world
+        paralysis = []
+        for char in self.characters:
+            effect = world.effects.get(char, Paralysis)
+            if effect is None or effect.ends is None:
+                paralysis.append(0)
+                continue
+            # Paralysis counts rounds, the search counts turns lost: the turn of a round already acted in is gone.
+            turns = effect.ends - world.effects.round
+            if world.timeline is not None and world.timeline.acted(char):
+                turns -= 1
+            paralysis.append(max(turns, 0))
+        protector = world.protector
+        return (self.index[player], tuple(max(char.health, 0) for char in self.characters), tuple(paralysis),
+                -1 if protector is None or protector.health <= 0 else self.index[protector], world.potions)
+
+    def best_move(self, player: Player) -> Move | None:
+        """Best move for player now, or None if it has nothing to do."""
+        root = self.state(player)
+        moves = self.moves(root)
+        if not moves:
+            return None
+        best = moves[0]
+        self._table.clear()
+        self.nodes = 0
+        self._deadline = perf_counter() + self.budget
+        for depth in range(1, self.max_depth + 1):
+            try:
+                scores = [self._expect(self.outcomes(root, move), depth - 1) for move in moves]
+            except OutOfTime:
+                break
+            best = moves[max(range(len(moves)), key=scores.__getitem__)]
+            if all(score in (0.0, 1.0) for score in scores):  # Every line is played out to the end.
+                break
+        return best
+
+    def command(self, move: Move) -> str:
+        """The action that plays move, e.g. 'attack Swamp Spider'."""
+        if move.verb in ('attack', 'heal'):
+            return f'{move.verb} {self.characters[move.targets[0]].name}'
+        return move.verb
+
+    # Rules.
+
+    def moves(self, state: tuple) -> list[Move]:
+        """What the player whose turn it is can do."""
+        turn, health, paralysis, protector, potions = state
+        player = self.characters[turn]
+        alive = [enemy for enemy in self.enemies if health[enemy] > 0]
+        if not alive:
+            return []
+        moves = [Move('attack', (enemy,)) for enemy in alive]
+        if isinstance(player, Archer):
+            # Triples on the first three alive enemies, spread or focused, keep the branching in check.
+            moves += [Move('triple', targets) for targets in combinations_with_replacement(alive[:3], 3)]
+        if isinstance(player, Knight) and protector != turn:
+            moves.append(Move('defend'))
+        wounded = [other for other in self.players if health[other] < self.max_health[other]]
+        if isinstance(player, Cleric) and wounded:
+            moves.append(Move('purify'))
+        if potions:
+            moves += [Move('heal', (other,)) for other in wounded]
+        return moves
+
+    def outcomes(self, state: tuple, move: Move) -> list[tuple[float, tuple]]:
+        """(probability, next state) of a player's move."""
+        turn, health, paralysis, protector, potions = state
+        player = self.characters[turn]
+        match move.verb:
+            case 'attack':
+                return self._hits(state, move.targets, player.stats.attack_power)
+            case 'triple':
+                return self._hits(state, move.targets, round(int(player.stats.attack_power / 6), 1))
+            case 'defend':
+                return [(1.0, self._advance((turn, health, paralysis, turn, potions)))]
+            case 'purify':
+                return [(1.0, self._advance((turn, self._healed(health, self.players, player.stats.healing_power),
+                                             paralysis, protector, potions)))]
+            case 'heal':
+                return [(1.0, self._advance((turn, self._healed(health, move.targets, self.world.potions_power),
+                                             paralysis, protector, potions - 1)))]
+
+    def _hits(self, state: tuple, targets: tuple[int, ...], damage: float) -> list[tuple[float, tuple]]:
+        """Every combination of dodges of the player's hits on targets, in order."""
+        turn, health, paralysis, protector, potions = state
+        odds = [self.dodge[target][turn] for target in targets]
+        outcomes = []
+        for dodged_hits in product((False, True), repeat=len(targets)):
+            probability = 1.0
+            hit_health = health
+            for target, chance, dodged_hit in zip(targets, odds, dodged_hits):
+                probability *= chance if dodged_hit else 1 - chance
+                if not dodged_hit and hit_health[target] > 0:
+                    hit_health = self._damaged(hit_health, target, damage)
+            if probability:
+                outcomes.append((probability, self._advance((turn, hit_health, paralysis, protector, potions))))
+        return outcomes
+
+    def enemy_outcomes(self, state: tuple) -> list[tuple[float, tuple]]:
+        """(probability, next state) of the turn of the enemy whose turn it is."""
+        turn, health, paralysis, protector, potions = state
+        enemy = self.characters[turn]
+        if protector >= 0:
+            targets = [protector]
+        else:
+            targets = [player for player in self.players if health[player] > 0]
+        share = 1 / len(targets)
+        outcomes = []
+        for target in targets:
+            # A hit on the protector ends its guard. A dodged attack does not.
+            guard = -1 if target == protector else protector
+            attack = share
+            if isinstance(enemy, QueenSpider):
+                attack *= 3 / 4  # randint(0, 3) == 1 paralyzes instead.
+                paralysed = paralysis[:target] + (3,) + paralysis[target + 1:]
+                outcomes.append((share / 4, self._advance((turn, health, paralysed, protector, potions))))
+            chance = self.dodge[target][turn]
+            if chance:
+                outcomes.append((attack * chance, self._advance((turn, health, paralysis, protector, potions))))
+            hit = self._damaged(health, target, enemy.stats.attack_power)
+            outcomes.append((attack * (1 - chance), self._advance((turn, hit, paralysis, guard, potions))))
+        return outcomes
+
+    @staticmethod
+    def _damaged(health: tuple, target: int, damage: float) -> tuple:
+        return health[:target] + (max(round(health[target] - damage, 1), 0),) + health[target + 1:]
+
+    def _healed(self, health: tuple, targets, amount: float) -> tuple:
+        health = list(health)
+        for target in targets:
+            if health[target] < self.max_health[target]:
+                health[target] = min(health[target] + amount, self.max_health[target])
+        return tuple(health)
+
+    def _advance(self, state: tuple) -> tuple:
+        """State on the next turn that is played. The dead are skipped, and so are paralysed players, who lose it."""
+        turn, health, paralysis, protector, potions = state
+        count = len(self.characters)
+        if protector >= 0 and health[protector] <= 0:
+            protector = -1
+        for _ in range(count):
+            turn = (turn + 1) % count
+            if health[turn] <= 0:
+                continue
+            if not paralysis[turn]:
+                break
+            paralysis = paralysis[:turn] + (paralysis[turn] - 1,) + paralysis[turn + 1:]
+        return turn, health, paralysis, protector, potions
+
+    # Search.
+
+    def score(self, state: tuple) -> float:
+        """Estimated chance of victory: 1 if won, 0 if lost, else how far ahead the party is on health."""
+        health = state[1]
+        party = sum(health[player] for player in self.players) / sum(self.max_health[p] for p in self.players)
+        enemies = sum(health[enemy] for enemy in self.enemies) / sum(self.max_health[e] for e in self.enemies)
+        if not enemies:
+            return 1.0
+        if not party:
+            return 0.0
+        return 0.5 + 0.5 * (party - enemies)
+
+    def _value(self, state: tuple, depth: int) -> float:
+        score = self.score(state)
+        if depth == 0 or score in (0.0, 1.0):
+            return score
+        key = (state, depth)
+        value = self._table.get(key)
+        if value is not None:
+            return value
+        self.nodes += 1
+        if not self.nodes % 256 and perf_counter() > self._deadline:
+            raise OutOfTime
+        if state[0] in self.players:
+            value = max(self._expect(self.outcomes(state, move), depth - 1) for move in self.moves(state))
+        else:
+            value = self._expect(self.enemy_outcomes(state), depth - 1)
+        self._table[key] = value
+        return value
+
+    def _expect(self, outcomes: list[tuple[float, tuple]], depth: int) -> float:
+        return sum(probability * self._value(state, depth) for probability, state in outcomes)
+
+
+class SearchPolicy:
+    """
+    Headless policy that plays each turn with the best move of a PartySearch, searched for budget seconds.
+    Out of battle, it lets go of the player and leaves it to the user.
+    """
+
+    def __init__(self, budget: float = 0.05) -> None:
+        self.budget = budget
+        self._targets = {}  # Player -> triple targets still to name.
+
+    def __call__(self, player: Player, prompt: str) -> str | None:
+        world = player.world
+        if prompt.startswith('Target'):
+            return self._targets[player].pop(0)
+        if prompt != 'Action: ':
+            return ''
+        if not world.in_battle:
+            player.policy = None
+            return None  # The user answers this prompt, and the ones after it.
+        search = PartySearch(world, self.budget)
+        move = search.best_move(player)
+        if move is None:
+            return 'continue'
+        if move.verb == 'triple':
+            self._targets[player] = [search.characters[target].name for target in move.targets]
+        return search.command(move)
+
+
+def hint(player: Player, budget: float = 0.05) -> list[str] | None:
+    """
+    Answers to give for the action a PartySearch of budget seconds recommends to player: the action, then the targets
+    it asks for, if any. None if there is nothing to do.
+    """
+    search = PartySearch(player.world, budget)
+    move = search.best_move(player)
+    if move is None:
+        return None
+    if move.verb == 'triple':
+        return ['triple'] + [search.characters[target].name for target in move.targets]
+    return [search.command(move)]
@@ -0,0 +1,145 @@
+from __future__ import annotations
+import asyncio
+import itertools
+from typing import Callable
+
+from adventure import campaign
+from classes import *
+import metrics
+
+
+class StreamSink:
+    """Sink that writes every event as game text to a connection. Writes are buffered by the transport."""
+    listening = True
+
+    def __init__(self, writer: asyncio.StreamWriter) -> None:
+        self.writer = writer
+        self.on_turn = None  # Called with the character on each TurnStart. Used for turn deadlines.
+
+    def write(self, event) -> None:
+        if self.on_turn is not None and type(event) is TurnStart:
+            self.on_turn(event.character)
+        self.writer.write(f'{event}\n'.encode())
+
+    def flush(self) -> None:
+        pass
+
+
+class Session:
+    """
+    One connection playing its own game in its own world. The game runs on the server's event loop,
+    and is only resumed when an answer arrives, so idle sessions cost no more than their world.
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, seed=None,
+                 turn_timeout: float = None, number: int = 0) -> None:
+        self.number = number
+        self.reader = reader
+        self.writer = writer
+        self.turn_timeout = turn_timeout  # Seconds a player has for a whole turn. None waits forever.
+        self.deadline = None
+        self.sink = StreamSink(writer)
+        self.sink.on_turn = self.start_turn
+        self.world = World(self.sink, seed)
+
+    def start_turn(self, character) -> None:
+        if self.turn_timeout is not None and isinstance(character, Player):
+            self.deadline = asyncio.get_running_loop().time() + self.turn_timeout
+
+    async def answer(self, prompt: Prompt) -> str | None:
+        """Answer to a prompt from the client, or None once the connection is closed."""
+        if prompt is PAUSE:  # Clients are not paced between turns.
+            return ''
+        self.world.sink.flush()
+        self.writer.write(prompt.text.encode())
+        await self.writer.drain()
+        if self.deadline is None or not self.world.in_battle:
+            line = await self.reader.readline()
+        else:
+            try:
+                line = await asyncio.wait_for(self.reader.readline(), self.deadline - asyncio.get_running_loop().time())
+            except asyncio.TimeoutError:
+                # The rest of the turn is skipped.
+                self.writer.write(b'\nOut of time!\n')
+                return 'continue' if prompt.text == 'Action: ' else ''
+        if not line:
+            return None
+        return line.decode(errors='replace').rstrip('\r\n')
+
+    async def run(self, steps: Callable[[World], object]) -> None:
+        """Plays the given game steps until they end or the client leaves."""
+        game = steps(self.world)
+        try:
+            prompt = next(game)
+            while True:
+                answer = await self.answer(prompt)
+                if answer is None:
+                    return
+                prompt = game.send(answer)
+        except StopIteration:
+            await self.writer.drain()
+        finally:
+            game.close()
+
+
+class GameServer:
+    """TCP server running many independent sessions of a game on one event loop."""
+
+    def __init__(self, steps: Callable[[World], object] = campaign, turn_timeout: float = None, seed: int = None,
+                 measure: bool = False):
+        self.steps = steps
+        self.turn_timeout = turn_timeout
+        self.seed = seed  # When set, session n plays with seed [seed, n].
+        self.measure = measure  # Turns metrics on in every session.
+        self.sessions = set()
+        self._numbers = itertools.count()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        number = next(self._numbers)
+        session = Session(reader, writer, None if self.seed is None else [self.seed, number], self.turn_timeout, number)
+        if self.measure:
+            metrics.enable(session.world)
+        self.sessions.add(session)
+        try:
+            await session.run(self.steps)
+        except ConnectionError:
+            pass
+        finally:
+            self.sessions.discard(session)
+            writer.close()
+
+    def measured(self):
+        """(labels, metrics, world) of the running sessions that have metrics, labelled by session number."""
+        return [({'session': str(session.number)}, session.world.metrics, session.world)
+                for session in self.sessions if session.world.metrics is not None]
+
+    def prometheus(self) -> str:
+        """Metrics of the running sessions in Prometheus text format."""
+        return metrics.prometheus(self.measured())
+
+    async def start(self, host: str = '127.0.0.1', port: int = 8023, **kwargs) -> asyncio.Server:
+        """Starts listening. Port 0 picks a free port."""
+        return await asyncio.start_server(self.handle, host, port, **kwargs)
+
+
+async def export(game_server: GameServer, path: str, interval: float) -> None:
+    """Writes the server's metrics to a file every interval seconds, for a scraper's textfile collector."""
+    while True:
+        await asyncio.sleep(interval)
+        metrics.write_prometheus(path, game_server.measured())
+
+
+async def serve(host: str = '127.0.0.1', port: int = 8023, turn_timeout: float = None,
+                metrics_path: str = None, metrics_interval: float = 15) -> None:
+    """Serves the adventure. With a metrics_path, sessions are measured and their metrics written there."""
+    game_server = GameServer(turn_timeout=turn_timeout, measure=metrics_path is not None)
+    server = await game_server.start(host, port, backlog=4096)
+    print(f'Serving on {", ".join(str(socket.getsockname()) for socket in server.sockets)}')
+    if metrics_path is not None:
+        exporter = asyncio.create_task(export(game_server, metrics_path, metrics_interval))  # Kept referenced.
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == '__main__':
+    asyncio.run(serve(turn_timeout=120))
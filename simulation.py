@@ -0,0 +1,339 @@
+from __future__ import annotations
+from dataclasses import dataclass
+
+import numpy as np
+
+from classes import *
+
+
+@dataclass
+class SimulationResult:
+    """Outcome of each of the simulated copies."""
+    victory: np.ndarray  # (K,) True where the party won.
+    rounds: np.ndarray  # (K,) Rounds played, as returned by battle().
+    health: np.ndarray  # (K, N) Final health of every combatant, in turn order.
+
+    @property
+    def win_rate(self) -> float:
+        return float(self.victory.mean())
+
+    @property
+    def mean_rounds(self) -> float:
+        return float(self.rounds.mean())
+
+
+class MonteCarlo:
+    """
+    K independent copies of a world's encounter, fought all at once with NumPy arrays.
+    Every array has one row per copy and one column per combatant, with combatants sorted in turn order.
+    Follows the rules of battle(): speed-ordered turns, dodged() rolls, rounded damage, random alive targets
+    and QueenSpider's paralyze chance. Players act as attack_policy does. Squads are not modelled, and rejected.
+    """
+
+    def __init__(self, world: World, copies: int, seed: int = None) -> None:
+        if any(isinstance(enemy, Squad) for enemy in world.enemy_list):
+            raise ValueError('MonteCarlo does not model squads')
+        # Same order as battle(). The sort is stable, so players go first on ties.
+        characters = sorted(world.player_list + world.enemy_list, key=lambda char: char.stats.speed, reverse=True)
+        self.characters = characters
+        self.copies = copies
+        self.rng = np.random.default_rng(seed)
+
+        def column(values) -> np.ndarray:
+            return np.tile(np.array(values, dtype=float), (copies, 1))
+
+        self.health = column([char.health for char in characters])
+        self.attack_power = column([char.stats.attack_power for char in characters])
+        self.speed = column([char.stats.speed for char in characters])
+        self.can_act = column([char.can_act if isinstance(char, Player) else 0 for char in characters])
+
+        self.is_player = np.array([isinstance(char, Player) for char in characters])
+        self.players = np.flatnonzero(self.is_player)
+        # attack_policy goes for the first alive enemy in the world's enemy list.
+        self.enemies = np.array([characters.index(enemy) for enemy in world.enemy_list], dtype=int)
+
+    def dodged(self, rows: np.ndarray, target: np.ndarray, source: int) -> np.ndarray:
+        """dodged() for many copies: uniform(-0.75, dodge_coefficient) >= 0."""
+        target_speed = self.speed[rows, target]
+        dodge_coefficient = np.round((target_speed - self.speed[rows, source]) / target_speed, 2)
+        return -0.75 + (dodge_coefficient + 0.75) * self.rng.random(len(rows)) >= 0
+
+    def hit(self, rows: np.ndarray, target: np.ndarray, source: int) -> None:
+        """Damages the targets of the given copies by the source's attack power, unless they dodge."""
+        hit = ~self.dodged(rows, target, source)
+        rows, target = rows[hit], target[hit]
+        self.health[rows, target] = np.round(self.health[rows, target] - self.attack_power[rows, source], 1)
+
+    def player_turn(self, rows: np.ndarray, player: int) -> None:
+        """Player's turn in the given copies. Mirrors user_actions with attack_policy."""
+        self.can_act[rows, player] += 1
+        rows = rows[self.can_act[rows, player] >= 1]  # The others are immobilized.
+        alive = self.health[np.ix_(rows, self.enemies)] > 0
+        target = self.enemies[alive.argmax(axis=1)]
+        self.hit(rows, target, player)
+        self.can_act[rows, player] -= 1
+
+    def enemy_turn(self, rows: np.ndarray, enemy: int) -> None:
+        """Enemy's turn in the given copies. Picks a random alive player and attacks or paralyzes them."""
+        alive = self.health[np.ix_(rows, self.players)] > 0
+        # The n-th alive player sits where the running count of alive players first exceeds n.
+        nth = (self.rng.random(len(rows)) * alive.sum(axis=1)).astype(int)
+        target = self.players[(alive.cumsum(axis=1) <= nth[:, None]).sum(axis=1)]
+
+        if isinstance(self.characters[enemy], QueenSpider):
+            paralyze = self.rng.integers(0, 4, len(rows)) == 1
+            self.can_act[rows[paralyze], target[paralyze]] = -3
+            rows, target = rows[~paralyze], target[~paralyze]
+        self.hit(rows, target, enemy)
+
+    def run(self, max_rounds: int = 1000) -> SimulationResult:
+        """Fights every copy until one side is defeated."""
+        rounds = np.zeros(self.copies, dtype=int)
+        victory = np.zeros(self.copies, dtype=bool)
+        defeat = np.zeros(self.copies, dtype=bool)
+
+        for _ in range(max_rounds):
+            ongoing = ~(victory | defeat)
+            if not ongoing.any():
+                break
+            rounds[ongoing] += 1
+
+            for char in range(len(self.characters)):
+                victory = (self.health[:, self.enemies] <= 0).all(axis=1)
+                defeat = (self.health[:, self.players] <= 0).all(axis=1)
+                rows = np.flatnonzero(~(victory | defeat) & (self.health[:, char] > 0))
+                if not len(rows):
+                    continue
+                if self.is_player[char]:
+                    self.player_turn(rows, char)
+                else:
+                    self.enemy_turn(rows, char)
+
+            victory = (self.health[:, self.enemies] <= 0).all(axis=1)
+            defeat = (self.health[:, self.players] <= 0).all(axis=1)
+
+        return SimulationResult(victory, rounds, self.health)
+
+
+@dataclass
+class ExactResult:
+    """Exact outcome of a battle, as computed by ExactSolver."""
+    win_rate: float
+    mean_rounds: float
+    states: int  # Battle states solved.
+
+
+class ExactSolver:
+    """
+    Victory probability and expected rounds of a small battle, computed exactly instead of sampled.
+    The battle is a Markov chain over states (turn, health of every combatant, paralysed turns left of every player),
+    with the rules MonteCarlo follows. Health only goes down, so states are solved one health vector at a time,
+    from the end of the battle backwards and memoized. Within a health vector, dodges and paralysis can loop back to
+    earlier states, so those states are solved together as a linear system.
+    Made for encounters of a few combatants a side, like the adventure's, which solve in milliseconds to a second.
+    Every split of the damage between players is a state of its own, so states grow exponentially with the party:
+    4 against 4 takes about 100k states and seconds, 6 against 6 millions of states, minutes and gigabytes.
+    Past max_states, the solver stops and raises ValueError; such battles are for MonteCarlo.
+    Squads are not modelled, and rejected.
+    """
+
+    def __init__(self, world: World, max_states: int = 500_000) -> None:
+        if any(isinstance(enemy, Squad) for enemy in world.enemy_list):
+            raise ValueError('ExactSolver does not model squads')
+        characters = sorted(world.player_list + world.enemy_list, key=lambda char: char.stats.speed, reverse=True)
+        self.characters = characters
+        self.players = tuple(i for i, char in enumerate(characters) if isinstance(char, Player))
+        self.enemies = tuple(characters.index(enemy) for enemy in world.enemy_list)  # attack_policy's order.
+        self.slot = {char: slot for slot, char in enumerate(self.players)}  # Character -> index in paralysis tuples.
+        self.attack_power = tuple(char.stats.attack_power for char in characters)
+        self.queen = tuple(isinstance(char, QueenSpider) for char in characters)
+        speeds = [char.stats.speed for char in characters]
+        self.twins = self._twins()
+        # Dodge chance of each target against each source.
+        self.dodge = [[dodge_chance(target, source) for source in speeds] for target in speeds]
+        # Health below 0 is kept at 0, and the dead are not paralysed: how dead a combatant is does not matter.
+        health = tuple(max(char.health, 0) for char in characters)
+        self.start = self._advance(-1, health, (0,) * len(self.players))
+        self.max_states = max_states
+        self._values = {}  # State -> (victory probability, expected rounds).
+        self._walks = {}  # Level start -> its walk, while lower levels it reaches are solved.
+
+    def _twins(self) -> list[tuple[int, ...]]:
+        """
+        Groups of players with the same stats, with no enemy acting between them. Players only act on enemies, and
+        enemies pick their targets at random, so swapping the health and paralysis of two such players changes
+        nothing, as long as either both or neither already acted this round.
+        """
+        groups, run = [], []
+        for position, char in enumerate(self.characters + [None]):
+            if isinstance(char, Player):
+                run.append(position)
+                continue
+            by_stats = {}
+            for player in run:
+                stats = self.characters[player].stats
+                by_stats.setdefault((stats.attack_power, stats.speed), []).append(player)
+            groups += [tuple(group) for group in by_stats.values() if len(group) > 1]
+            run = []
+        return groups
+
+    def solve(self) -> ExactResult:
+        win_rate, mean_rounds = self.value(self.start)
+        return ExactResult(win_rate, mean_rounds, len(self._values))
+
+    def value(self, state: tuple) -> tuple[float, float]:
+        values = self._values
+        # Levels wait on the stack for the lower ones they reach, so long battles do not run out of recursion.
+        stack = [state]
+        while stack:
+            start = stack[-1]
+            if start in values:
+                stack.pop()
+                continue
+            missing = self._solve_level(start)
+            if missing:
+                stack += missing
+            else:
+                stack.pop()
+        return values[state]
+
+    def _advance(self, turn: int, health: tuple, paralysis: tuple) -> tuple:
+        """
+        State of the next turn that can change anything. Turns of the dead are skipped, and so are those of
+        paralysed players, who lose them. Turn 0 is never skipped, as rounds are counted on it.
+        """
+        count, slots = len(self.characters), self.slot
+        turn = (turn + 1) % count
+        while turn:
+            if health[turn] > 0:
+                slot = slots.get(turn)
+                if slot is None or not paralysis[slot]:
+                    break
+                paralysis = paralysis[:slot] + (paralysis[slot] - 1,) + paralysis[slot + 1:]
+            turn = (turn + 1) % count
+        # Twins are sorted by health and paralysis, so that states only differing by a swap of twins are one.
+        for group in self.twins:
+            if turn <= group[0] or turn > group[-1]:
+                twin_slots = [slots[player] for player in group]
+                pairs = sorted(((health[player], paralysis[slot]) for player, slot in zip(group, twin_slots)),
+                               reverse=True)
+                health, paralysis = list(health), list(paralysis)
+                for player, slot, (player_health, player_paralysis) in zip(group, twin_slots, pairs):
+                    health[player], paralysis[slot] = player_health, player_paralysis
+                health, paralysis = tuple(health), tuple(paralysis)
+        return turn, health, paralysis
+
+    def _hit(self, state: tuple, target: int, attacker: int) -> tuple:
+        """State after attacker's hit on target, on to the next turn."""
+        turn, health, paralysis = state
+        left = max(round(health[target] - self.attack_power[attacker], 1), 0)
+        health = health[:target] + (left,) + health[target + 1:]
+        if not left and target in self.slot:
+            slot = self.slot[target]
+            paralysis = paralysis[:slot] + (0,) + paralysis[slot + 1:]
+        return self._advance(turn, health, paralysis)
+
+    def transitions(self, state: tuple):
+        """Yields (probability, next state) for the turn of state, in a battle that is not over."""
+        turn, health, paralysis = state
+        if health[turn] <= 0:  # Only turn 0 is kept for the dead.
+            yield 1.0, self._advance(turn, health, paralysis)
+            return
+        dodge = self.dodge
+        if turn in self.slot:
+            slot = self.slot[turn]
+            if paralysis[slot]:  # Only on turn 0 too.
+                yield 1.0, self._advance(turn, health, paralysis[:slot] + (paralysis[slot] - 1,) + paralysis[slot + 1:])
+                return
+            target = next(enemy for enemy in self.enemies if health[enemy] > 0)
+            chance = dodge[target][turn]
+            if chance:
+                yield chance, self._advance(turn, health, paralysis)
+            yield 1 - chance, self._hit(state, target, turn)
+            return
+
+        alive = [player for player in self.players if health[player] > 0]
+        following = self._advance(turn, health, paralysis)
+        share = 1 / len(alive)
+        attack = share * 3 / 4 if self.queen[turn] else share  # randint(0, 3) == 1 paralyzes instead.
+        for target in alive:
+            if self.queen[turn]:
+                slot = self.slot[target]
+                yield share / 4, self._advance(turn, health, paralysis[:slot] + (3,) + paralysis[slot + 1:])
+            chance = dodge[target][turn]
+            if chance:
+                yield attack * chance, following
+            yield attack * (1 - chance), self._hit(state, target, turn)
+
+    def outcome(self, health: tuple) -> tuple[float, float] | None:
+        """(victory, rounds) of a battle that is over, or None if it goes on."""
+        if not any(health[enemy] for enemy in self.enemies):
+            return 1.0, 0.0
+        if not any(health[player] for player in self.players):
+            return 0.0, 0.0
+        return None
+
+    def _solve_level(self, start: tuple) -> list[tuple]:
+        """
+        Solves start and every state it reaches while everyone's health stays the same.
+        If some of the lower health states they reach are not solved yet, solves nothing and returns those instead.
+        The walk is kept for when they are.
+        """
+        health = start[1]
+        outcome = self.outcome(health)
+        if outcome is not None:
+            self._values[start] = outcome
+            return []
+        values = self._values
+        walk = self._walks.pop(start, None)
+        if walk is None:
+            walk = self._walk(start)
+        states, rows = walk
+        missing = [following for _, _, outside in rows for _, following in outside if following not in values]
+        if missing:
+            self._walks[start] = walk
+            return missing
+
+        constants = []
+        for rounds, inner, outside in rows:
+            win = 0.0
+            for probability, following in outside:
+                known = values[following]
+                win += probability * known[0]
+                rounds += probability * known[1]
+            constants.append((win, rounds))
+        if len(states) == 1:  # Most levels: x = b + a x, a being the odds of staying, e.g. by dodging every hit.
+            stay = 1.0 - sum(probability for _, probability in rows[0][1])
+            values[start] = (constants[0][0] / stay, constants[0][1] / stay)
+        else:
+            # x = b + A x, for victory and rounds at once.
+            matrix = np.eye(len(states))
+            for row, (_, inner, _) in enumerate(rows):
+                for column, probability in inner:
+                    matrix[row, column] -= probability
+            for state, solution in zip(states, np.linalg.solve(matrix, np.array(constants)).tolist()):
+                values[state] = tuple(solution)
+        if len(values) > self.max_states:
+            raise ValueError(f'Battle has more than {self.max_states} states. Use MonteCarlo instead.')
+        return []
+
+    def _walk(self, start: tuple) -> tuple[list, list]:
+        """
+        States of start's level, and a row per state: (rounds it starts, (position, probability) of the next states
+        in the level, (probability, state) of the others).
+        """
+        health, values = start[1], self._values
+        states, index, rows = [start], {start: 0}, []
+        for state in states:  # Grows while it is walked.
+            inner, outside = [], []
+            for probability, following in self.transitions(state):
+                if following[1] != health or following in values:
+                    outside.append((probability, following))
+                    continue
+                position = index.get(following)
+                if position is None:
+                    position = index[following] = len(states)
+                    states.append(following)
+                inner.append((position, probability))
+            rows.append((0.0 if state[0] else 1.0, inner, outside))  # A round starts on turn 0.
+        return states, rows
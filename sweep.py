@@ -0,0 +1,97 @@
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, replace
+from itertools import product
+from math import ceil
+from os import cpu_count
+from typing import Callable
+
+from classes import *
+
+
+@dataclass
+class SweepResult:
+    """Aggregated outcome of every battle fought at one grid point."""
+    params: dict
+    battles: int
+    win_rate: float
+    mean_rounds: float
+    mean_survivor_health: float  # Remaining party health, summed over players. 0 on defeat.
+
+
+def tuned(stats: Stats, name: str, params: dict) -> Stats:
+    """Returns a copy of stats with every '<name>.<stat>' parameter applied."""
+    prefix = f'{name}.'
+    changes = {key[len(prefix):]: value for key, value in params.items() if key.startswith(prefix)}
+    return replace(stats, **changes)
+
+
+def queen_spider_encounter(world: World, params: dict) -> None:
+    """
+    Second battle of adventure.py, with Ayame wielding the Vane of Arthropods.
+    Tunable keys: 'Queen Spider.<stat>' and 'Vane of Arthropods.<stat>'.
+    """
+    party = Archer(world, 'Crystia'), Knight(world, 'Ayame'), Cleric(world, 'Yana')
+    for player in party:
+        player.policy = attack_policy
+
+    vane = catalog['Vane of Arthropods']
+    vane_of_arthropods = EquipItem(vane.name, vane.equip_slot, vane.for_class, tuned(vane.upgrades, vane.name, params))
+    world.inventory.add(vane_of_arthropods)
+    party[1].equipment.equip(vane_of_arthropods)
+
+    QueenSpider(world, 'Queen Spider',
+                tuned(Stats(max_health=100, attack_power=50, speed=5), 'Queen Spider', params))
+
+
+def _run_chunk(encounter: Callable, params: dict, seed: int, point: int, start: int, stop: int) -> tuple:
+    """Fights battles start..stop of a grid point. Each battle has its own seed, so chunking never changes them."""
+    wins, rounds, survivor_health = 0, 0, 0
+    for index in range(start, stop):
+        world = World(NullSink(), seed=[seed, point, index])
+        encounter(world, params)
+        rounds += battle(world, headless=True)
+        wins += not world.defeat
+        survivor_health += sum(player.health for player in world.player_list if player.health > 0)
+    return wins, rounds, survivor_health
+
+
+def sweep(grid: dict[str, list], battles: int = 100, seed: int = 0, encounter: Callable = queen_spider_encounter,
+          workers: int = None, chunk_size: int = None) -> list[SweepResult]:
+    """
+    Fights a number of seeded headless battles for every combination of the grid's parameters.
+    grid maps '<name>.<stat>' keys to the values to try, e.g. {'Queen Spider.attack_power': [40, 50, 60]}.
+    encounter builds the fight into a fresh world. It must be a module-level function so that workers can use it.
+    Results are the same for a given seed, whatever the number of workers.
+    """
+    keys = list(grid)
+    points = [dict(zip(keys, values)) for values in product(*grid.values())]
+    workers = workers or cpu_count() or 1
+    if chunk_size is None:
+        # Around four chunks per worker keeps every core busy until the end.
+        chunk_size = max(1, ceil(battles * len(points) / (workers * 4)))
+
+    tasks = [(encounter, params, seed, point, start, min(start + chunk_size, battles))
+             for point, params in enumerate(points)
+             for start in range(0, battles, chunk_size)]
+    if workers == 1:
+        chunks = [_run_chunk(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(workers) as executor:
+            chunks = list(executor.map(_run_chunk, *zip(*tasks)))
+
+    totals = [[0, 0, 0] for _ in points]
+    for task, chunk in zip(tasks, chunks):
+        total = totals[task[3]]
+        for i, value in enumerate(chunk):
+            total[i] += value
+
+    return [SweepResult(params, battles, wins / battles, rounds / battles, survivor_health / battles)
+            for params, (wins, rounds, survivor_health) in zip(points, totals)]
+
+
+if __name__ == '__main__':
+    for result in sweep({'Queen Spider.attack_power': [40, 50, 60],
+                         'Vane of Arthropods.attack_power': [1.25, 1.5, 2]}, battles=1000):
+        print(f'{result.params}: win rate {result.win_rate:.1%}, {result.mean_rounds:.2f} rounds, '
+              f'{result.mean_survivor_health:.1f} survivor health')
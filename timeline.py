@@ -0,0 +1,75 @@
+from __future__ import annotations
+from heapq import heappop, heappush
+from itertools import count
+
+
+class Timeline:
+    """
+    Battle turn order. Each round, every alive combatant acts once, fastest first.
+    Combatants sit in two heaps keyed on speed: those still to act this round and those who already did.
+    Entries are invalidated in place instead of being searched for, so every operation costs O(log n).
+    """
+
+    def __init__(self, characters: list = ()) -> None:
+        self._current = []  # Still to act this round.
+        self._next = []  # Already acted. Become _current on the next round.
+        self._entries = {}  # Character -> (entry, heap holding it).
+        self._order = count()  # Breaks speed ties by order of arrival, like a stable sort.
+        self._seq = {}  # Character -> its tie-breaker. Kept for the whole battle.
+        for character in characters:
+            self.add(character)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, character) -> bool:
+        return character in self._entries
+
+    def _push(self, character, heap: list) -> None:
+        if character not in self._seq:
+            self._seq[character] = next(self._order)
+        entry = [-character.stats.speed, self._seq[character], character]
+        heappush(heap, entry)
+        self._entries[character] = (entry, heap)
+
+    def acted(self, character) -> bool:
+        """Whether a scheduled combatant already acted this round."""
+        entry, heap = self._entries.get(character, (None, None))
+        return heap is self._next
+
+    def add(self, character, this_round: bool = False) -> None:
+        """Schedules a combatant. It acts from the next round on, unless this_round."""
+        if character in self._entries:
+            return
+        self._push(character, self._current if this_round else self._next)
+
+    def remove(self, character) -> None:
+        """Drops a combatant from the battle."""
+        entry, heap = self._entries.pop(character, (None, None))
+        if entry is not None:
+            entry[-1] = None  # Skipped when popped.
+
+    def reschedule(self, character) -> None:
+        """Re-keys a combatant whose speed changed. It keeps its place in the current or next round."""
+        entry, heap = self._entries.get(character, (None, None))
+        if entry is None or entry[0] == -character.stats.speed:
+            return
+        entry[-1] = None
+        self._push(character, heap)
+
+    def pop(self):
+        """Returns the next combatant to act this round, or None once everyone did. Dead ones are dropped."""
+        while self._current:
+            character = heappop(self._current)[-1]
+            if character is None:
+                continue
+            del self._entries[character]
+            if character.health <= 0:
+                continue
+            self._push(character, self._next)
+            return character
+        return None
+
+    def new_round(self) -> None:
+        """Everyone who acted, or joined, acts again. Call once pop has returned None."""
+        self._current, self._next = self._next, self._current
@@ -0,0 +1,211 @@
+from __future__ import annotations
+from typing import Callable, Iterable
+
+from classes import *
+
+
+class SpatialHash:
+    """
+    Members placed on a plane of integer tiles, bucketed in square cells of cell_size tiles.
+    Range queries only look at the cells overlapping the range, so they cost what is around, not what is placed.
+    """
+
+    def __init__(self, cell_size: int = 8) -> None:
+        self.cell_size = cell_size
+        self._cells = {}  # (cell x, cell y) -> {member: None}. Dicts as ordered sets.
+        self._positions = {}  # Member -> (x, y).
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __contains__(self, member) -> bool:
+        return member in self._positions
+
+    def position(self, member) -> tuple[int, int] | None:
+        return self._positions.get(member)
+
+    def place(self, member, x: int, y: int) -> None:
+        """Puts member on tile (x, y). Placed members are moved there."""
+        size = self.cell_size
+        cell = (x // size, y // size)
+        old = self._positions.get(member)
+        self._positions[member] = (x, y)
+        if old is not None:
+            old_cell = (old[0] // size, old[1] // size)
+            if old_cell == cell:
+                return
+            self._discard(member, old_cell)
+        members = self._cells.get(cell)
+        if members is None:
+            members = self._cells[cell] = {}
+        members[member] = None
+
+    def remove(self, member) -> None:
+        """Takes member off the plane. Does nothing if it is not on it."""
+        position = self._positions.pop(member, None)
+        if position is not None:
+            self._discard(member, (position[0] // self.cell_size, position[1] // self.cell_size))
+
+    def _discard(self, member, cell: tuple[int, int]) -> None:
+        members = self._cells[cell]
+        del members[member]
+        if not members:
+            del self._cells[cell]
+
+    def within(self, x: int, y: int, radius: float):
+        """Yields the members at most radius tiles away from (x, y), in straight line."""
+        size = self.cell_size
+        radius_squared = radius * radius
+        positions = self._positions
+        cells = self._cells
+        low_y, high_y = int((y - radius) // size), int((y + radius) // size)
+        for cell_x in range(int((x - radius) // size), int((x + radius) // size) + 1):
+            for cell_y in range(low_y, high_y + 1):
+                members = cells.get((cell_x, cell_y))
+                if members is None:
+                    continue
+                for member in members:
+                    member_x, member_y = positions[member]
+                    if (member_x - x) ** 2 + (member_y - y) ** 2 <= radius_squared:
+                        yield member
+
+    def nearest(self, x: int, y: int, radius: float, condition: Callable[[object], bool] = None):
+        """Closest member within radius that meets condition, or None."""
+        best, best_distance = None, None
+        positions = self._positions
+        for member in self.within(x, y, radius):
+            if condition is not None and not condition(member):
+                continue
+            member_x, member_y = positions[member]
+            distance = (member_x - x) ** 2 + (member_y - y) ** 2
+            if best is None or distance < best_distance:
+                best, best_distance = member, distance
+        return best
+
+
+# Loaders fill a chunk the first time it is needed. They are called with the world and the chunk's coordinates,
+# create the chunk's enemies and entities in the world, and return them with their tiles as (member, x, y).
+# The enemies they create stay idle, out of the world's battles, until they engage.
+ChunkLoader = Callable[[World, int, int], Iterable[tuple[object, int, int]]]
+
+
+class WorldMap:
+    """
+    Tiled map of a world: where its players, enemies and entities stand.
+    The map is split in square chunks of chunk_size tiles, which are only loaded once a player comes within view
+    chunks of them, so a large map costs what the party has explored. A chunk whose members are all removed, e.g.
+    released with the encounter that loaded it, loads again the next time it is needed.
+    """
+
+    def __init__(self, world: World, loader: ChunkLoader = None, chunk_size: int = 32, view: int = 1,
+                 cell_size: int = 8) -> None:
+        self.world = world
+        self.loader = loader
+        self.chunk_size = chunk_size
+        self.view = view  # Chunks loaded around each player, in every direction.
+        self.grid = SpatialHash(cell_size)
+        self.chunks = set()  # Chunks loaded so far, as (chunk x, chunk y).
+        self.idle = {}  # Chunk enemies that have not engaged yet -> None. Dicts as ordered sets.
+        self._loaded = {}  # Chunk -> {member: None}, what it loaded that is still on the map.
+        self._chunk_of = {}  # Member -> chunk that loaded it.
+        world.map = self
+
+    def position(self, member) -> tuple[int, int] | None:
+        return self.grid.position(member)
+
+    def place(self, member, x: int, y: int) -> None:
+        """Puts member on tile (x, y), or moves it there. Players load the chunks around them."""
+        self.grid.place(member, x, y)
+        if isinstance(member, Player):
+            self.load_around(x, y)
+
+    def move(self, member, dx: int, dy: int) -> None:
+        x, y = self.grid.position(member)
+        self.place(member, x + dx, y + dy)
+
+    def move_party(self, dx: int, dy: int) -> None:
+        """Moves every placed player by the same number of tiles."""
+        for player in self.world.player_list:
+            if player in self.grid:
+                self.move(player, dx, dy)
+
+    def remove(self, member) -> None:
+        self.grid.remove(member)
+        self.idle.pop(member, None)
+        chunk = self._chunk_of.pop(member, None)
+        if chunk is None:
+            return
+        members = self._loaded[chunk]
+        del members[member]
+        if not members:
+            del self._loaded[chunk]
+            self.chunks.discard(chunk)
+
+    def load_around(self, x: int, y: int) -> None:
+        """Loads the chunks within view of tile (x, y) that are not loaded yet."""
+        size, view = self.chunk_size, self.view
+        chunk_x, chunk_y = x // size, y // size
+        for cx in range(chunk_x - view, chunk_x + view + 1):
+            for cy in range(chunk_y - view, chunk_y + view + 1):
+                if (cx, cy) in self.chunks:
+                    continue
+                self.chunks.add((cx, cy))
+                if self.loader is not None:
+                    self._load(cx, cy)
+
+    def _load(self, chunk_x: int, chunk_y: int) -> None:
+        world, chunk = self.world, (chunk_x, chunk_y)
+        mark, victory = len(world.enemy_list), world.victory
+        members = {}
+        for member, member_x, member_y in self.loader(world, chunk_x, chunk_y):
+            self.grid.place(member, member_x, member_y)
+            members[member] = None
+            self._chunk_of[member] = chunk
+        if members:
+            self._loaded[chunk] = members
+        # The loader's enemies joined the world's battles on creation. They wait out of them until they engage.
+        for enemy in world.enemy_list[mark:]:
+            world.enemies.discard(enemy)
+            self.idle[enemy] = None
+        del world.enemy_list[mark:]
+        world.victory = victory
+
+    def engage(self, enemy: Enemy) -> None:
+        """Brings an idle chunk enemy into the world's battles. Does nothing if it already engaged."""
+        if enemy not in self.idle:
+            return
+        del self.idle[enemy]
+        world = self.world
+        world.enemy_list.append(enemy)
+        world.enemies.add(enemy)
+        world.victory = False
+
+    def engage_around(self, member, radius: float) -> list[Enemy]:
+        """Engages the alive idle enemies at most radius tiles away from member, e.g. those that spot the party."""
+        engaged = [other for other in self.around(member, radius) if other in self.idle and other.health > 0]
+        for enemy in engaged:
+            self.engage(enemy)
+        return engaged
+
+    def around(self, member, radius: float):
+        """Yields what is at most radius tiles away from member, itself excluded."""
+        x, y = self.grid.position(member)
+        for other in self.grid.within(x, y, radius):
+            if other is not member:
+                yield other
+
+    def in_reach(self, attacker: Player | Enemy) -> list:
+        """Alive targets attacker can hit from where it stands: enemies and entities for players, players for enemies."""
+        targets = (Enemy, Entity) if isinstance(attacker, Player) else Player
+        return [other for other in self.around(attacker, attacker.reach)
+                if isinstance(other, targets) and other.health > 0]
+
+    def lootable(self, player: Player, radius: float = 1.5) -> list:
+        """Dead enemies and broken entities next to player that still hold items."""
+        return [other for other in self.around(player, radius)
+                if isinstance(other, (Enemy, Entity)) and other.health <= 0 and other.inventory]
+
+    def nearest_enemy(self, member, radius: float) -> Enemy | None:
+        """Closest alive enemy within radius of member."""
+        x, y = self.grid.position(member)
+        return self.grid.nearest(x, y, radius, lambda other: isinstance(other, Enemy) and other.health > 0)